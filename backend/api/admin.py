@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created_at', 'endpoint', 'database', 'duration')
+    list_filter = ('endpoint', 'database')
+    search_fields = ('shape', 'endpoint')
+    readonly_fields = ('shape_hash', 'shape', 'endpoint', 'database',
+                       'duration', 'plan', 'created_at')
+    empty_value_display = '-пусто-'
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
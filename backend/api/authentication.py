@@ -0,0 +1,54 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def get_token_cache():
+    return caches[settings.AUTH_TOKEN_CACHE]
+
+
+def make_token_cache_key(key):
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(keys):
+    get_token_cache().delete_many(
+        [make_token_cache_key(key) for key in keys]
+    )
+
+
+def invalidate_user_tokens(users):
+    invalidate_tokens(
+        Token.objects.filter(user__in=users).values_list('key', flat=True)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    TokenAuthentication, который держит пары token -> user в кэше
+    settings.AUTH_TOKEN_CACHE. Кэш общий для всех воркеров, иначе отзыв
+    токена видел бы только обработавший его воркер.
+
+    Размер и время жизни записей задаются настройками кэша
+    (MAX_ENTRIES, TIMEOUT). Записи сбрасываются при удалении токена
+    (в том числе при logout через djoser), при любом сохранении
+    пользователя, включая деактивацию, и при User.objects.update()
+    полей, влияющих на вход.
+    '''
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = make_token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token)
+        elif not token.user.is_active:
+            cache.delete(cache_key)
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
@@ -1,7 +1,21 @@
+from django.conf import settings
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipe, Tag
+from recipes.popularity import annotate_popularity
+from recipes.tag_masks import get_tags_mask
+
+# Сортировки по полям рецепта; у каждой есть индекс Recipe.Meta.indexes,
+# в том числе с author впереди для фильтра по автору.
+FIELD_ORDERINGS = {
+    'newest': ('-pub_date', '-id'),
+    'fastest': ('cooking_time', 'id'),
+    'alphabetical': ('name', 'id'),
+}
+# Сортировки по счетчикам RecipePopularity.
+POPULARITY_ORDERINGS = ('popular', 'trending')
 
 
 class IngredientSearchFilter(SearchFilter):
@@ -12,17 +26,56 @@ class RecipesFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name='tags__slug',
-        to_field_name='slug'
+        to_field_name='slug',
+        method='get_tags'
+    )
+    tags_all = filters.ModelMultipleChoiceFilter(
+        queryset=Tag.objects.all(),
+        field_name='tags__slug',
+        to_field_name='slug',
+        method='get_tags_all'
     )
     is_favorited = filters.NumberFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(
         method='get_is_in_shopping_cart'
     )
+    cooking_time = filters.RangeFilter()
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('newest', 'Новые'),
+            ('fastest', 'Быстрые в приготовлении'),
+            ('alphabetical', 'По алфавиту'),
+            ('popular', 'Популярные'),
+            ('trending', 'Популярные за неделю'),
+        ),
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
         fields = ['author', 'tags']
 
+    def get_tags(self, queryset, name, value):
+        '''
+        Рецепты с любым из тегов. Условие на Recipe.tags_mask
+        проверяется в той же строке рецепта, без JOIN и DISTINCT, и не
+        мешает сортировке по индексу рецептов.
+        '''
+        if not value:
+            return queryset
+        return queryset.alias(
+            tags_any_match=F('tags_mask').bitand(get_tags_mask(value))
+        ).exclude(tags_any_match=0)
+
+    def get_tags_all(self, queryset, name, value):
+        '''Рецепты со всеми тегами.'''
+        if not value:
+            return queryset
+        mask = get_tags_mask(value)
+        return queryset.alias(
+            tags_all_match=F('tags_mask').bitand(mask)
+        ).filter(tags_all_match=mask)
+
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
@@ -34,3 +87,12 @@ class RecipesFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(recipe_shopping_cart__user=user)
         return queryset
+
+    def get_ordering(self, queryset, name, value):
+        if value in FIELD_ORDERINGS:
+            return queryset.order_by(*FIELD_ORDERINGS[value])
+        days = (settings.POPULARITY_TRENDING_DAYS
+                if value == 'trending' else None)
+        return annotate_popularity(queryset, days).order_by(
+            '-popularity_score', '-pub_date'
+        )
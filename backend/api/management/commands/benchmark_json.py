@@ -0,0 +1,83 @@
+import timeit
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+
+
+def make_recipe_page(recipes, ingredients):
+    '''Страница списка рецептов в форме ответа /api/recipes/.'''
+    return {
+        'count': 1000,
+        'next': 'http://localhost/api/recipes/?page=2',
+        'previous': None,
+        'results': [{
+            'id': pk,
+            'tags': [{'id': 1, 'name': 'Завтрак', 'color': '#E26C2D',
+                      'slug': 'breakfast'}],
+            'author': {'id': 1, 'email': 'cook@example.com',
+                       'username': 'cook', 'first_name': 'Иван',
+                       'last_name': 'Поваров', 'is_subscribed': False},
+            'ingredients': [{
+                'id': number, 'name': f'Ингредиент {number}',
+                'measurement_unit': 'г', 'amount': number * 10,
+            } for number in range(ingredients)],
+            'is_favorited': pk % 2 == 0,
+            'is_in_shopping_cart': False,
+            'name': f'Рецепт {pk}',
+            'image': f'http://localhost/media/recipes/images/{pk}.jpg',
+            'text': 'Смешать ингредиенты и готовить до готовности. ' * 5,
+            'cooking_time': 30,
+        } for pk in range(recipes)],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF and orjson JSON rendering and parsing speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=6,
+            help='Recipes on the page'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=20,
+            help='Ingredients per recipe'
+        )
+        parser.add_argument(
+            '--number',
+            type=int,
+            default=2000,
+            help='Runs per measurement'
+        )
+
+    def handle(self, *args, **kwargs):
+        data = make_recipe_page(kwargs['recipes'], kwargs['ingredients'])
+        body = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != body:
+            raise CommandError('FastJSONRenderer output differs')
+        if FastJSONParser().parse(BytesIO(body)) != JSONParser().parse(
+                BytesIO(body)):
+            raise CommandError('FastJSONParser result differs')
+        print(f'Page: {len(body)} bytes')
+        for name, slow, fast in (
+            ('render', lambda: JSONRenderer().render(data),
+             lambda: FastJSONRenderer().render(data)),
+            ('parse', lambda: JSONParser().parse(BytesIO(body)),
+             lambda: FastJSONParser().parse(BytesIO(body))),
+        ):
+            slow_us = self.measure(slow, kwargs['number'])
+            fast_us = self.measure(fast, kwargs['number'])
+            print(f'{name}: DRF {slow_us:.0f} us, orjson {fast_us:.0f} us '
+                  f'({slow_us / fast_us:.1f}x)')
+
+    @staticmethod
+    def measure(func, number):
+        return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
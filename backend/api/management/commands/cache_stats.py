@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from foodgram import metrics
+from foodgram.cache import STAT_NAMES, get_published_stats
+
+
+class Command(BaseCommand):
+    help = 'Show TieredCache hit and miss counters of all workers'
+
+    def handle(self, *args, **kwargs):
+        if not metrics.is_shared():
+            raise CommandError(metrics.NOT_SHARED_ERROR)
+        stats = get_published_stats()
+        for name in STAT_NAMES:
+            print(f'{name}: {stats[name]}')
+        print(f'hit_ratio: {stats["hit_ratio"]:.1%}')
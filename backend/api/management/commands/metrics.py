@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from foodgram import metrics
+
+
+class Command(BaseCommand):
+    help = 'Show counters collected by foodgram.metrics in all processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'prefix',
+            nargs='?',
+            default='',
+            help='Only counters whose name starts with PREFIX, '
+                 'e.g. query_deadline_exceeded'
+        )
+
+    def handle(self, *args, **kwargs):
+        if not metrics.is_shared():
+            raise CommandError(metrics.NOT_SHARED_ERROR)
+        for name, value in metrics.get_values(kwargs['prefix']).items():
+            print(f'{name}: {value}')
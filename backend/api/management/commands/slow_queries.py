@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from api.models import SlowQuery
+
+SHAPE_WIDTH = 200
+
+
+class Command(BaseCommand):
+    help = 'Rank slow query shapes by total time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=1,
+            help='Rank queries recorded during the last DAYS days'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Number of query shapes to show'
+        )
+        parser.add_argument(
+            '--endpoint',
+            help='Only queries issued by this endpoint (basename.action)'
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Show the latest EXPLAIN plan of every shape'
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete records older than SLOW_QUERIES["RETENTION_DAYS"]'
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['prune']:
+            count, _ = SlowQuery.objects.filter(
+                created_at__lt=timezone.now() - timedelta(
+                    days=settings.SLOW_QUERIES['RETENTION_DAYS']
+                )
+            ).delete()
+            print(f'Deleted {count} slow queries')
+        queries = SlowQuery.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=kwargs['days'])
+        )
+        if kwargs['endpoint']:
+            queries = queries.filter(endpoint=kwargs['endpoint'])
+        shapes = queries.order_by().values('shape_hash').annotate(
+            total=Sum('duration'), count=Count('id'),
+            longest=Max('duration'), last_id=Max('id')
+        ).order_by('-total')[:kwargs['limit']]
+        for rank, shape in enumerate(shapes, 1):
+            self.print_shape(rank, shape, queries, kwargs['plans'])
+
+    def print_shape(self, rank, shape, queries, plans):
+        latest = SlowQuery.objects.get(pk=shape['last_id'])
+        print(
+            f'{rank}. total {shape["total"]:.1f} ms, '
+            f'{shape["count"]} queries, '
+            f'avg {shape["total"] / shape["count"]:.1f} ms, '
+            f'max {shape["longest"]:.1f} ms [{shape["shape_hash"][:8]}]'
+        )
+        endpoints = queries.filter(
+            shape_hash=shape['shape_hash']
+        ).order_by().values('endpoint').annotate(
+            total=Sum('duration'), count=Count('id')
+        ).order_by('-total')
+        for endpoint in endpoints:
+            print(f'   {endpoint["endpoint"]}: {endpoint["total"]:.1f} ms, '
+                  f'{endpoint["count"]} queries')
+        print(f'   {latest.shape[:SHAPE_WIDTH]}')
+        if plans:
+            plan = queries.filter(
+                shape_hash=shape['shape_hash']
+            ).exclude(plan='').values_list('plan', flat=True).first()
+            if plan:
+                print('\n'.join(f'     {line}' for line in plan.splitlines()))
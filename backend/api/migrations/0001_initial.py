@@ -0,0 +1,36 @@
+# Generated by Django 4.1.6 on 2026-10-19 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shape_hash', models.CharField(max_length=32, verbose_name='Хеш формы запроса')),
+                ('shape', models.TextField(verbose_name='Форма запроса')),
+                ('endpoint', models.CharField(max_length=200, verbose_name='Эндпоинт')),
+                ('database', models.CharField(max_length=100, verbose_name='База данных')),
+                ('duration', models.FloatField(verbose_name='Длительность, мс')),
+                ('plan', models.TextField(blank=True, verbose_name='План выполнения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время запроса')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='slowquery',
+            index=models.Index(fields=['shape_hash', 'created_at'], name='slow_query_shape_idx'),
+        ),
+    ]
@@ -0,0 +1,124 @@
+import hashlib
+
+from django.db.models import Count, Max, Subquery
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from foodgram.db_router import choose_replica, replica_alias
+from recipes.catalog import catalog_store
+from users.models import User
+
+
+class ConditionalGetMixin:
+    '''
+    Отвечает 304 Not Modified на условные GET-запросы.
+
+    ETag и Last-Modified считаются одним агрегирующим запросом по
+    conditional_fields, без сериализации объектов. Представление
+    зависит от пользователя (is_subscribed, is_favorited), поэтому
+    в валидаторы входит и updated_at текущего пользователя. Он читается
+    тем же запросом, а не из request.user: пользователь может прийти
+    из кэша аутентификации с устаревшим значением.
+
+    Last-Modified отдается только для retrieve: удаление объекта из
+    списка не сдвигает Max(updated_at), и клиент с одним
+    If-Modified-Since получил бы устаревший 304. Списки проверяются
+    только по ETag, в который входит число объектов.
+    '''
+    conditional_fields = ('updated_at',)
+
+    def get_conditional_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'list':
+            return queryset
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return queryset.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+
+    def get_conditional_validators(self):
+        user = self.request.user
+        aggregates = {field: Max(field) for field in self.conditional_fields}
+        if user.is_authenticated:
+            aggregates['viewer'] = Max(Subquery(
+                User.objects.filter(pk=user.pk).values('updated_at')
+            ))
+        state = self.get_conditional_queryset().aggregate(
+            count=Count('pk', distinct=True), **aggregates
+        )
+        if not state['count'] and self.action != 'list':
+            return None, None
+        viewer_updated_at = state.pop('viewer', None)
+        timestamps = [state[field] for field in self.conditional_fields]
+        timestamps.append(viewer_updated_at)
+        last_modified = None
+        if self.action != 'list':
+            last_modified = max(filter(None, timestamps), default=None)
+        fingerprint = repr((
+            self.action, self.request.get_full_path(), user.pk,
+            viewer_updated_at, sorted(state.items())
+        ))
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+        return etag, last_modified and int(last_modified.timestamp())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_conditional_validators()
+        self.conditional_etag = etag
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            return response
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ReplicaReadMixin:
+    '''Выполняет безопасные (SAFE_METHODS) запросы на реплике базы.'''
+
+    def dispatch(self, request, *args, **kwargs):
+        token = replica_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            replica_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            replica_alias.set(choose_replica(request.user))
+
+
+class CatalogRetrieveMixin:
+    '''retrieve() из каталога recipes.catalog, без запроса к базе.'''
+    catalog_getter = None
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+        data = getattr(catalog_store.get(), self.catalog_getter)(pk)
+        if data is None:
+            raise Http404
+        return Response(data)
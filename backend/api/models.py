@@ -0,0 +1,35 @@
+from django.db import models
+
+
+class SlowQuery(models.Model):
+    '''
+    SQL-запрос дольше SLOW_QUERIES['THRESHOLD_MS'] и эндпоинт
+    '<basename>.<action>', который его выполнил. Для части запросов
+    на PostgreSQL сохраняется план EXPLAIN (ANALYZE, BUFFERS).
+    Пишется SlowQueryMiddleware, ранжируется командой slow_queries.
+    '''
+    shape_hash = models.CharField('Хеш формы запроса', max_length=32)
+    shape = models.TextField('Форма запроса')
+    endpoint = models.CharField('Эндпоинт', max_length=200)
+    database = models.CharField('База данных', max_length=100)
+    duration = models.FloatField('Длительность, мс')
+    plan = models.TextField('План выполнения', blank=True)
+    created_at = models.DateTimeField(
+        'Время запроса',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        ordering = ('-created_at',)
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+        indexes = [
+            models.Index(
+                fields=['shape_hash', 'created_at'],
+                name='slow_query_shape_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.endpoint}: {self.duration:.0f} мс'
@@ -0,0 +1,31 @@
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, is_orjson_safe, orjson
+
+
+class FastJSONParser(JSONParser):
+    '''
+    JSONParser на orjson. Тела, которые orjson не принимает или читает
+    иначе, чем json (NaN и Infinity, целые больше 64 бит превращаются
+    в float), разбирает стандартный JSONParser; он же работает без
+    orjson и для кодировок кроме UTF-8.
+    '''
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+        else:
+            if is_orjson_safe([data]):
+                return data
+        return super().parse(BytesIO(body), media_type, parser_context)
@@ -0,0 +1,203 @@
+from collections import defaultdict
+
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.db.models.lookups import GreaterThan
+from rest_framework.fields import DateTimeField
+
+from api.serializers import (RecipeSerializer, UserListSerializer,
+                             get_requested_fields)
+from recipes.catalog import catalog_store
+from recipes.models import (TAGS_MASK_BITS, Ingredient, IngredientAmount,
+                            Recipe, Subscription)
+from users.models import User
+
+# Диапазоны времени приготовления для фасетов, границы включительно;
+# совпадают с параметрами cooking_time_min и cooking_time_max.
+COOKING_TIME_FACETS = ((1, 15), (16, 30), (31, 60), (61, None))
+
+
+class RecipeListReader:
+    '''
+    Собирает ответ RecipeSerializer(many=True) из плоских строк .values().
+
+    Теги, ингредиенты и авторы загружаются одним запросом на страницу
+    каждый и раскладываются по рецептам словарями, поэтому стоимость
+    строки сводится к сборке dict. Формат ответа, включая ?fields= и
+    ?omit=, совпадает с RecipeSerializer.
+    '''
+    columns = ('text', 'image', 'cooking_time', 'name', 'pub_date')
+
+    def __init__(self, request):
+        self.request = request
+        self.fields = [
+            field for field in RecipeSerializer.Meta.fields
+            if field in get_requested_fields(
+                request, RecipeSerializer.Meta.fields
+            )
+        ]
+        self.date_field = DateTimeField()
+        self.image_storage = Recipe._meta.get_field('image').storage
+
+    def get_values(self, queryset):
+        columns = ['id'] + [
+            field for field in self.fields
+            if field in self.columns or field in queryset.query.annotations
+        ]
+        if 'author' in self.fields:
+            columns.append('author_id')
+        if 'tags' in self.fields:
+            columns.append('tags_mask')
+        return queryset.values(*columns)
+
+    def read(self, rows):
+        ids = [row['id'] for row in rows]
+        tags = self.get_tags(rows) if 'tags' in self.fields else {}
+        ingredients = (self.get_ingredients(ids)
+                       if 'ingredients' in self.fields else {})
+        authors = (self.get_authors({row['author_id'] for row in rows})
+                   if 'author' in self.fields else {})
+        result = []
+        for row in rows:
+            recipe = {}
+            for field in self.fields:
+                if field == 'tags':
+                    recipe['tags'] = tags.get(row['id'], [])
+                elif field == 'ingredients':
+                    recipe['ingredients'] = ingredients.get(row['id'], [])
+                elif field == 'author':
+                    recipe['author'] = authors[row['author_id']]
+                elif field == 'image':
+                    recipe['image'] = self.get_image_url(row['image'])
+                elif field == 'pub_date':
+                    recipe['pub_date'] = self.date_field.to_representation(
+                        row['pub_date']
+                    )
+                else:
+                    recipe[field] = row.get(field, False)
+            result.append(recipe)
+        return result
+
+    def get_tags(self, rows):
+        '''
+        Теги раскладываются по битам Recipe.tags_mask из каталога
+        recipes.catalog. Рецепты с битом, которого в каталоге еще нет
+        (тег создан после сборки каталога), читаются из базы.
+        '''
+        tags_by_bit = catalog_store.get().get_tags_by_bit()
+        tags = {}
+        missing = []
+        for row in rows:
+            mask = row['tags_mask']
+            bits = [bit for bit in range(TAGS_MASK_BITS) if mask >> bit & 1]
+            if all(bit in tags_by_bit for bit in bits):
+                tags[row['id']] = sorted(
+                    (tags_by_bit[bit] for bit in bits),
+                    key=lambda tag: tag['id']
+                )
+            else:
+                missing.append(row['id'])
+        if missing:
+            tags.update(self.get_stored_tags(missing))
+        return tags
+
+    def get_stored_tags(self, ids):
+        tags = defaultdict(list)
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).order_by('tag_id').values(
+            'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'
+        )
+        for row in rows:
+            tags[row['recipe_id']].append({
+                'id': row['tag__id'],
+                'name': row['tag__name'],
+                'color': row['tag__color'],
+                'slug': row['tag__slug'],
+            })
+        return tags
+
+    def get_ingredients(self, ids):
+        '''
+        Из базы читаются только количества; названия и единицы измерения
+        берутся из каталога, недостающие в нем — одним запросом.
+        '''
+        ingredients = defaultdict(list)
+        rows = list(IngredientAmount.objects.filter(
+            recipe_id__in=ids
+        ).order_by('id').values('recipe_id', 'ingredient_id', 'amount'))
+        ingredient_ids = {row['ingredient_id'] for row in rows}
+        catalog = catalog_store.get().get_ingredients(ingredient_ids)
+        missing = ingredient_ids - catalog.keys()
+        if missing:
+            catalog.update(
+                (ingredient['id'], ingredient)
+                for ingredient in Ingredient.objects.filter(
+                    pk__in=missing
+                ).values('id', 'name', 'measurement_unit')
+            )
+        for row in rows:
+            ingredients[row['recipe_id']].append({
+                **catalog[row['ingredient_id']], 'amount': row['amount'],
+            })
+        return ingredients
+
+    def get_authors(self, ids):
+        fields = [
+            field for field in UserListSerializer.Meta.fields
+            if field != 'is_subscribed'
+        ]
+        queryset = User.objects.filter(id__in=ids)
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        authors = {}
+        for row in queryset.values(*fields, *(
+            ('is_subscribed',) if user.is_authenticated else ()
+        )):
+            row.setdefault('is_subscribed', False)
+            authors[row['id']] = row
+        return authors
+
+    def get_image_url(self, name):
+        if not name:
+            return None
+        return self.request.build_absolute_uri(self.image_storage.url(name))
+
+
+def get_recipe_facets(queryset):
+    '''
+    Число рецептов queryset по каждому тегу и диапазону времени
+    приготовления. Все счетчики — условные COUNT одного агрегирующего
+    запроса: теги проверяются по Recipe.tags_mask, без JOIN, а их
+    список берется из каталога recipes.catalog.
+    '''
+    tags = catalog_store.get().get_tags_by_bit()
+    aggregates = {
+        f'tag_{bit}': Count('pk', filter=GreaterThan(
+            F('tags_mask').bitand(1 << bit), 0
+        ))
+        for bit in tags
+    }
+    for minimum, maximum in COOKING_TIME_FACETS:
+        condition = Q(cooking_time__gte=minimum)
+        if maximum is not None:
+            condition &= Q(cooking_time__lte=maximum)
+        aggregates[f'cooking_time_{minimum}'] = Count('pk', filter=condition)
+    counts = queryset.order_by().aggregate(**aggregates)
+    return {
+        'tags': [{
+            'id': tag['id'],
+            'name': tag['name'],
+            'slug': tag['slug'],
+            'count': counts[f'tag_{bit}'],
+        } for bit, tag in sorted(
+            tags.items(), key=lambda item: item[1]['id']
+        )],
+        'cooking_time': [{
+            'min': minimum,
+            'max': maximum,
+            'count': counts[f'cooking_time_{minimum}'],
+        } for minimum, maximum in COOKING_TIME_FACETS],
+    }
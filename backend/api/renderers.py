@@ -0,0 +1,68 @@
+from decimal import Decimal
+from enum import Enum
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Типы, которые orjson и json записывают одинаково.
+ORJSON_SAFE_TYPES = {str, int, bool, type(None)}
+
+
+def is_orjson_safe(data):
+    '''
+    False, если в data есть значения, которые orjson записывает иначе,
+    чем json: числа с плавающей точкой (формат экспоненты, NaN и
+    Infinity вместо ошибки STRICT_JSON), Decimal и Enum.
+    '''
+    stack = [data]
+    while stack:
+        container = stack.pop()
+        if isinstance(container, dict):
+            container = container.values()
+        for value in container:
+            if type(value) in ORJSON_SAFE_TYPES:
+                continue
+            if isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+            elif isinstance(value, (float, Decimal, Enum)):
+                return False
+    return True
+
+
+class FastJSONRenderer(JSONRenderer):
+    '''
+    JSONRenderer на orjson. Вывод совпадает с JSONRenderer при
+    UNICODE_JSON и COMPACT_JSON: UTF-8 без \\u-экранирования кириллицы,
+    без пробелов. Данные, которые orjson записал бы иначе (числа с
+    плавающей точкой, ключи не строки, целые больше 64 бит), а также
+    запросы без orjson и с отступами (browsable API,
+    "application/json; indent=4") отдаются стандартному JSONRenderer.
+    '''
+    options = (orjson.OPT_PASSTHROUGH_DATETIME
+               | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (orjson is None or data is None or indent is not None
+                or self.ensure_ascii or not self.compact
+                or not is_orjson_safe([data])):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранируем U+2028 и U+2029 для JavaScript.
+        return ret.replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def default(self, obj):
+        '''JSONEncoder.default; результат с float уходит в JSONRenderer.'''
+        value = self.encoder_class().default(obj)
+        if not is_orjson_safe([value]):
+            raise TypeError('Value is rendered by JSONRenderer')
+        return value
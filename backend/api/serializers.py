@@ -2,6 +2,7 @@ import base64
 import uuid
 
 from django.core.files.base import ContentFile
+from django.db import transaction
 
 from djoser.serializers import UserSerializer
 from rest_framework import serializers, status
@@ -10,10 +11,46 @@ from drf_extra_fields.fields import Base64ImageField
 
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
                             Recipe, ShoppingCart, Subscription, Tag)
+from recipes.signals import recipe_changes, touch_recipes
 from users.models import User
 
 
-class UserListSerializer(UserSerializer):
+def get_requested_fields(request, fields):
+    '''Имена из fields, оставшиеся после параметров ?fields= и ?omit=.'''
+    requested = set(fields)
+    if request is None:
+        return requested
+    only = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if only:
+        requested &= set(only.split(','))
+    if omit:
+        requested -= set(omit.split(','))
+    return requested
+
+
+class SparseFieldsetMixin:
+    '''
+    Ограничивает поля корневого сериализатора параметрами ?fields= и
+    ?omit=. Отброшенные поля не сериализуются вовсе; вложенные
+    сериализаторы параметры запроса не учитывают.
+    '''
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent
+        if isinstance(root, serializers.ListSerializer):
+            root = root.parent
+        if root is not None:
+            return fields
+        requested = get_requested_fields(self.context.get('request'), fields)
+        return {
+            name: field for name, field in fields.items()
+            if name in requested
+        }
+
+
+class UserListSerializer(SparseFieldsetMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -27,13 +64,15 @@ class UserListSerializer(UserSerializer):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Subscription.objects.filter(user=user, author=obj).exists()
 
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'color', 'slug')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -54,7 +93,7 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserListSerializer(read_only=True)
     image = Base64ImageField()
     ingredients = serializers.SerializerMethodField(read_only=True)
@@ -69,20 +108,23 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'cooking_time', 'name', 'pub_date')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return (self.context.get('request').user.is_authenticated
                 and FavoriteRecipe.objects.filter(
                     user=self.context.get('request').user,
                     recipe_id=obj.id).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return (self.context.get('request').user.is_authenticated
                 and ShoppingCart.objects.filter(
                     user=self.context.get('request').user,
                     recipe_id=obj.id).exists())
 
     def get_ingredients(self, obj):
-        queryset = IngredientAmount.objects.filter(recipe=obj)
-        return IngredientAmountSerializer(queryset, many=True).data
+        return IngredientAmountSerializer(obj.recipe.all(), many=True).data
 
 
 class Base64ImageField(serializers.ImageField):
@@ -149,25 +191,30 @@ class RecipeEditSerializer(serializers.ModelSerializer):
                 ingredient=Ingredient.objects.get(id=ingredient['id']),
                 amount=ingredient['amount']
             ) for ingredient in ingredients])
+        touch_recipes([recipe.pk])
 
+    @transaction.atomic
     def create(self, validate_data):
         ingredients = validate_data.pop('ingredients')
         tags = validate_data.pop('tags')
-        recipe = Recipe.objects.create(**validate_data)
-        recipe.tags.set(tags)
-        self.create_ingredients(ingredients, recipe)
+        with recipe_changes():
+            recipe = Recipe.objects.create(**validate_data)
+            recipe.tags.set(tags)
+            self.create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validate_data):
         ingredients = validate_data.pop('ingredients')
         tags = validate_data.pop('tags')
-        recipe = super().update(recipe, validate_data)
-        recipe.tags.clear()
-        recipe.ingredients.clear()
-        recipe.tags.set(tags)
-        self.create_ingredients(recipe=recipe,
-                                ingredients=ingredients)
-        recipe.save()
+        with recipe_changes():
+            recipe = super().update(recipe, validate_data)
+            recipe.tags.clear()
+            recipe.ingredients.clear()
+            recipe.tags.set(tags)
+            self.create_ingredients(recipe=recipe,
+                                    ingredients=ingredients)
+            recipe.save()
         return recipe
 
     def to_representation(self, instance):
@@ -185,6 +232,38 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class RecipeBatchSerializer(serializers.Serializer):
+    '''Список id рецептов для пакетного добавления и удаления.'''
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+    def validate_recipes(self, value):
+        recipes = list(Recipe.objects.filter(id__in=value))
+        missing = set(value) - {recipe.id for recipe in recipes}
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не найдены: {sorted(missing)}'
+            )
+        return recipes
+
+
+class SubRequestSerializer(serializers.Serializer):
+    '''GET-запрос внутри пакета: путь ресурса относительно /api/.'''
+    resource = serializers.RegexField(r'^[\w-]+(/[\w-]+)*/?$', max_length=200)
+    params = serializers.DictField(required=False, default=dict)
+
+
+class CompositeRequestSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=SubRequestSerializer(),
+        allow_empty=False,
+        max_length=10
+    )
+
+
 class SubscriptionSerializer(UserListSerializer):
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
@@ -202,11 +281,6 @@ class SubscriptionSerializer(UserListSerializer):
     def validate(self, data):
         author = self.instance
         user = self.context.get('request').user
-        if Subscription.objects.filter(author=author, user=user).exists():
-            raise ValidationError(
-                detail='Вы уже подписались на данного пользователя',
-                code=status.HTTP_400_BAD_REQUEST
-            )
         if author == user:
             raise ValidationError(
                 detail='Нельзя подписаться на самого себя',
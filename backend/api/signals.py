@@ -0,0 +1,35 @@
+from django.contrib.auth import user_logged_out
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from foodgram.cache import tiered_cache
+from users.models import User, users_updated
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user_tokens([instance])
+
+
+@receiver(users_updated, sender=User)
+def users_updated_handler(sender, pks, **kwargs):
+    invalidate_user_tokens(pks)
+
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, user, **kwargs):
+    if user is not None:
+        invalidate_user_tokens([user])
+
+
+@receiver(request_finished)
+def publish_cache_stats(sender, **kwargs):
+    tiered_cache.publish_stats()
@@ -0,0 +1,92 @@
+import math
+
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    '''
+    Token bucket: в ведре до num_requests токенов, за duration секунд
+    оно наполняется полностью. Запрос списывает столько токенов, сколько
+    стоит его эндпоинт (settings.THROTTLE_COSTS); списки дополнительно
+    умножают стоимость на число запрошенных через ?limit= страниц.
+    Состояние ведра хранится в кэше по умолчанию; чтобы лимит был общим
+    для всех воркеров, этот кэш должен быть общим (CACHE_BACKEND).
+    '''
+    cache_format = 'throttle_bucket_%(scope)s_%(ident)s'
+
+    def get_endpoint(self, view):
+        basename = getattr(view, 'basename', None) or view.__class__.__name__
+        return f'{basename}.{getattr(view, "action", None) or "default"}'
+
+    def get_cost(self, request, view):
+        cost = settings.THROTTLE_COSTS.get(self.get_endpoint(view), 1)
+        paginator = (getattr(view, 'paginator', None)
+                     if getattr(view, 'action', None) == 'list' else None)
+        page_size = getattr(paginator, 'page_size', None)
+        if page_size:
+            requested = paginator.get_page_size(request) or page_size
+            cost *= max(1, math.ceil(requested / page_size))
+        return min(cost, self.num_requests)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        now = self.timer()
+        tokens, updated = self.cache.get(self.key, (self.num_requests, now))
+        tokens = min(
+            self.num_requests,
+            tokens + (now - updated) * self.num_requests / self.duration
+        )
+        cost = self.get_cost(request, view)
+        self.wait_seconds = None
+        if tokens < cost:
+            self.wait_seconds = (
+                (cost - tokens) * self.duration / self.num_requests
+            )
+        else:
+            tokens -= cost
+        self.cache.set(self.key, (tokens, now), self.duration)
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    '''Общее ведро анонимного клиента (по IP).'''
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            return None
+        return self.cache_format % {
+            'scope': self.scope, 'ident': self.get_ident(request)
+        }
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    '''Общее ведро пользователя на все эндпоинты.'''
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated:
+            return None
+        return self.cache_format % {
+            'scope': self.scope, 'ident': request.user.pk
+        }
+
+
+class ActionTokenBucketThrottle(TokenBucketThrottle):
+    '''Отдельное ведро пользователя (или IP) на каждый эндпоинт.'''
+    scope = 'action'
+
+    def get_cache_key(self, request, view):
+        ident = (request.user.pk if request.user.is_authenticated
+                 else self.get_ident(request))
+        return self.cache_format % {
+            'scope': self.scope, 'ident': f'{ident}_{self.get_endpoint(view)}'
+        }
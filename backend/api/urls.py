@@ -2,8 +2,8 @@ from django.urls import include, path
 
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomUserViewSet, TagViewSet,
-                    IngredientViewSet, RecipeViewSet)
+from .views import (CompositeView, CustomUserViewSet, TagViewSet,
+                    IngredientViewSet, ProfileView, RecipeViewSet)
 
 app_name = 'api'
 
@@ -14,6 +14,9 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('tags', TagViewSet, basename='tags')
 
 urlpatterns = [
+    path('batch/', CompositeView.as_view(), name='batch'),
+    path('profiles/<str:profile_id>/', ProfileView.as_view(),
+         name='profile'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
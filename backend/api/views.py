@@ -1,32 +1,79 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Sum
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import quote_etag
 
 from djoser.views import UserViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (SAFE_METHODS, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.views import APIView
 
-from .filters import IngredientSearchFilter, RecipesFilter
+from .filters import (POPULARITY_ORDERINGS, IngredientSearchFilter,
+                      RecipesFilter)
+from .mixins import (CatalogRetrieveMixin, ConditionalGetMixin,
+                     ReplicaReadMixin)
 from .pagination import LimitPageNumberPagination
+from .readers import RecipeListReader, get_recipe_facets
 from .permissions import IsAuthorOrReadOnly, IsAdminOrReadOnly
 from .serializers import (ShortRecipeSerializer, IngredientSerializer,
-                          RecipeEditSerializer, RecipeSerializer,
+                          CompositeRequestSerializer,
+                          RecipeBatchSerializer, RecipeEditSerializer,
+                          RecipeSerializer,
                           SubscriptionSerializer, TagSerializer,
-                          UserListSerializer)
-from recipes.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
-                            Subscription, Tag, IngredientAmount)
+                          UserListSerializer, get_requested_fields)
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe, RecipeChange,
+                            ShoppingCart, Subscription, Tag, IngredientAmount)
+from foodgram.cache import tiered_cache
+from foodgram.profiling import get_profile
+from recipes.catalog import catalog_store
+from recipes.popularity import insert_relations, update_popularity
+from recipes.signals import RECIPES_CACHE_NAMESPACE, touch_users
 from users.models import User
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ReplicaReadMixin, ConditionalGetMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserListSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if (self.action in ('list', 'retrieve') and user.is_authenticated
+                and 'is_subscribed' in get_requested_fields(
+                    self.request, UserListSerializer.Meta.fields)):
+            return queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return queryset
+
+    def get_permissions(self):
+        if self.action == 'me':
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    def get_conditional_queryset(self):
+        if self.action == 'me':
+            return User.objects.filter(pk=self.request.user.pk)
+        return super().get_conditional_queryset()
+
     @action(
         permission_classes=(IsAuthenticated,),
         url_path='subscribe',
@@ -45,7 +92,16 @@ class CustomUserViewSet(UserViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            Subscription.objects.create(user=user, author=author)
+            try:
+                with transaction.atomic():
+                    Subscription.objects.create(user=user, author=author)
+            except IntegrityError:
+                raise ValidationError(
+                    detail={api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Вы уже подписались на данного пользователя'
+                    ]},
+                    code=status.HTTP_400_BAD_REQUEST
+                )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
@@ -54,6 +110,50 @@ class CustomUserViewSet(UserViewSet):
             subuscription.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path='me/state'
+    )
+    def state(self, request):
+        '''
+        Отсортированные id избранных рецептов, рецептов в корзине и
+        авторов в подписках. state_version растет при каждом изменении
+        этих списков и служит ETag: при совпадении If-None-Match списки
+        не читаются. Версия читается до списков, поэтому не может
+        оказаться новее них.
+        '''
+        user = request.user
+        version = User.objects.filter(pk=user.pk).values_list(
+            'state_version', flat=True
+        ).get()
+        etag = quote_etag(f'state-{version}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response({
+                'version': version,
+                'favorited': self.get_state_ids(
+                    FavoriteRecipe, user, 'recipe_id'
+                ),
+                'shopping_cart': self.get_state_ids(
+                    ShoppingCart, user, 'recipe_id'
+                ),
+                'subscriptions': self.get_state_ids(
+                    Subscription, user, 'author_id'
+                ),
+            })
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    @staticmethod
+    def get_state_ids(model, user, field):
+        '''Читает только индекс уникального ограничения (user, field).'''
+        return list(model.objects.filter(user=user).order_by(
+            field
+        ).values_list(field, flat=True))
+
     @action(
         methods=['GET'],
         detail=False,
@@ -71,29 +171,190 @@ class CustomUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, CatalogRetrieveMixin,
+                 viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
+    catalog_getter = 'get_tag'
+
+    def list(self, request, *args, **kwargs):
+        return Response(catalog_store.get().list_tags())
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, CatalogRetrieveMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('^name',)
     pagination_class = None
+    catalog_getter = 'get_ingredient'
 
+    def list(self, request, *args, **kwargs):
+        return Response(catalog_store.get().list_ingredients(
+            IngredientSearchFilter().get_search_terms(request)
+        ))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAdminOrReadOnly | IsAuthorOrReadOnly,)
     filterset_class = RecipesFilter
     filter_backends = (DjangoFilterBackend,)
     pagination_class = LimitPageNumberPagination
 
+    @property
+    def conditional_fields(self):
+        fields = ('updated_at', 'author__updated_at')
+        if (self.request.query_params.get('ordering')
+                in POPULARITY_ORDERINGS):
+            return fields + ('popularity__updated_at',)
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'changes'):
+            return queryset
+        fields = get_requested_fields(
+            self.request, RecipeSerializer.Meta.fields
+        )
+        if self.action == 'retrieve':
+            queryset = self.prefetch_related_fields(queryset, fields)
+        user = self.request.user
+        annotations = {}
+        if user.is_authenticated and 'is_favorited' in fields:
+            annotations['is_favorited'] = Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        if user.is_authenticated and 'is_in_shopping_cart' in fields:
+            annotations['is_in_shopping_cart'] = Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        return queryset.annotate(**annotations)
+
+    def prefetch_related_fields(self, queryset, fields):
+        user = self.request.user
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id'))
+            )
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            ))
+        if 'author' not in fields:
+            return queryset
+        if not user.is_authenticated:
+            return queryset.select_related('author')
+        return queryset.prefetch_related(Prefetch(
+            'author',
+            queryset=User.objects.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        ))
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.list_values, request, *args, **kwargs
+        )
+
+    def list_values(self, request, *args, **kwargs):
+        '''
+        Страницы ленты для анонимных пользователей одинаковы для всех и
+        берутся из TieredCache; пересчет страницы выполняется один раз.
+        ETag входит в ключ, поэтому тело страницы всегда соответствует
+        своим валидаторам.
+        '''
+        if request.user.is_authenticated:
+            return Response(self.get_list_data(request))
+        return Response(tiered_cache.get_or_set(
+            RECIPES_CACHE_NAMESPACE,
+            (request.build_absolute_uri(), self.conditional_etag),
+            lambda: self.get_list_data(request),
+            settings.RECIPE_LIST_CACHE_TIMEOUT
+        ))
+
+    def get_list_data(self, request):
+        '''
+        Список рецептов без RecipeSerializer: строки .values() дополняются
+        тегами, ингредиентами и авторами пакетными запросами на страницу.
+        С ?facets=1 в ответ добавляются счетчики по тегам и времени
+        приготовления для того же отфильтрованного списка.
+        '''
+        reader = RecipeListReader(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = reader.get_values(queryset)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return reader.read(list(rows))
+        data = self.get_paginated_response(reader.read(page)).data
+        if request.query_params.get('facets') in ('1', 'true'):
+            data['facets'] = get_recipe_facets(queryset)
+        return data
+
+    @action(
+        detail=True,
+        methods=('get',),
+        pagination_class=None)
+    def similar(self, request, pk=None):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe
+        ).order_by('-similar_to__score', 'id')
+        serializer = ShortRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        pagination_class=None,
+        url_path='changes')
+    def changes(self, request):
+        '''
+        Рецепты, созданные или измененные после токена ?since=, и id
+        удаленных рецептов. За запрос читается не больше
+        RECIPE_CHANGES_BATCH_SIZE записей журнала; при has_more клиент
+        запрашивает следующую порцию с полученным token.
+        '''
+        since = request.query_params.get('since', '0')
+        if not since.isdigit():
+            raise ValidationError({'since': ['Некорректный токен изменений']})
+        batch_size = settings.RECIPE_CHANGES_BATCH_SIZE
+        changes = list(RecipeChange.objects.filter(
+            id__gt=int(since),
+            changed_at__lte=timezone.now() - timedelta(
+                seconds=settings.RECIPE_CHANGES_SETTLE_SECONDS
+            )
+        ).order_by('id').values_list(
+            'id', 'recipe_id', 'deleted'
+        )[:batch_size + 1])
+        has_more = len(changes) > batch_size
+        changes = changes[:batch_size]
+        latest = {recipe: deleted for _, recipe, deleted in changes}
+        reader = RecipeListReader(request)
+        rows = list(reader.get_values(self.get_queryset().filter(pk__in=[
+            recipe for recipe, deleted in latest.items() if not deleted
+        ])).order_by('id'))
+        return Response({
+            'token': str(changes[-1][0]) if changes else since,
+            'has_more': has_more,
+            'changed': reader.read(rows),
+            'deleted': sorted(
+                set(latest) - {row['id'] for row in rows}
+            ),
+        })
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
@@ -134,24 +395,43 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return response
 
     def add_obj(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe = get_object_or_404(Recipe, id=pk)
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
             return Response({
                 'errors': 'Рецепт добавлен в список'
             }, status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
         serializer = ShortRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_obj(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        deleted, _ = model.objects.filter(user=user, recipe_id=pk).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({
             'errors': 'Рецепт удален'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    def batch_obj(self, model, request):
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        with transaction.atomic():
+            if request.method == 'DELETE':
+                model.objects.filter(
+                    user=request.user, recipe__in=recipes
+                ).delete()
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            added = insert_relations(
+                model, request.user.pk, [recipe.pk for recipe in recipes]
+            )
+            update_popularity(model, added, 1)
+            touch_users([request.user.pk])
+        serializer = ShortRecipeSerializer(recipes, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -173,3 +453,93 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if request.method == 'DELETE':
             return self.delete_obj(ShoppingCart, request.user, pk)
         return None
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=None,
+        url_path='favorite')
+    def favorite_batch(self, request):
+        return self.batch_obj(FavoriteRecipe, request)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=None,
+        url_path='shopping_cart')
+    def shopping_cart_batch(self, request):
+        return self.batch_obj(ShoppingCart, request)
+
+
+class CompositeView(APIView):
+    '''
+    Выполняет до 10 GET-запросов к API за один HTTP-запрос. Подзапросы
+    вызывают представления напрямую, минуя middleware, и наследуют
+    результат аутентификации внешнего запроса; ответы возвращаются
+    вместе в исходном порядке.
+    '''
+    # POST только передает GET-подзапросы: PrimaryPinMiddleware не
+    # закрепляет пользователя за основной базой.
+    read_only = True
+    # Заголовки внешнего запроса, которые не относятся к подзапросам.
+    skipped_headers = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+                       'HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH')
+
+    def post(self, request):
+        serializer = CompositeRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'responses': [
+            self.get_subresponse(request, **subrequest)
+            for subrequest in serializer.validated_data['requests']
+        ]})
+
+    def get_subrequest(self, request, path, params):
+        environ = {
+            key: value for key, value in request.META.items()
+            if key.startswith('HTTP_') and key not in self.skipped_headers
+        }
+        environ.update({
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': request.META.get('SCRIPT_NAME', ''),
+            'PATH_INFO': path,
+            'QUERY_STRING': urlencode(params, doseq=True),
+            'REMOTE_ADDR': request.META.get('REMOTE_ADDR', ''),
+            'SERVER_NAME': request.META.get('SERVER_NAME', ''),
+            'SERVER_PORT': request.META.get('SERVER_PORT', ''),
+            'wsgi.input': BytesIO(),
+            'wsgi.url_scheme': request.scheme,
+        })
+        subrequest = WSGIRequest(environ)
+        if request.user.is_authenticated:
+            subrequest._force_auth_user = request.user
+            subrequest._force_auth_token = request.auth
+        return subrequest
+
+    def get_subresponse(self, request, resource, params):
+        path = f'/api/{resource.strip("/")}/'
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        if match is None or getattr(match.func, 'cls', None) is type(self):
+            return {'resource': resource, 'status': 404,
+                    'data': {'detail': 'Страница не найдена.'}}
+        response = match.func(
+            self.get_subrequest(request, path, params),
+            *match.args, **match.kwargs
+        )
+        return {'resource': resource, 'status': response.status_code,
+                'data': getattr(response, 'data', None)}
+
+
+class ProfileView(APIView):
+    '''Отчет ProfilerMiddleware по id из заголовка X-Profile-Id.'''
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, profile_id):
+        report = get_profile(profile_id)
+        if report is None:
+            raise Http404
+        return Response(report)
@@ -0,0 +1,237 @@
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+MISSING = object()
+# Счетчики TieredCache; в foodgram.metrics — с префиксом STATS_PREFIX.
+STAT_NAMES = ('local_hits', 'shared_hits', 'misses', 'computes', 'waits')
+STATS_PREFIX = 'tiered_cache:'
+
+
+def get_hit_ratio(stats):
+    lookups = sum(
+        stats.get(name, 0) for name in ('local_hits', 'shared_hits', 'misses')
+    )
+    hits = stats.get('local_hits', 0) + stats.get('shared_hits', 0)
+    return hits / lookups if lookups else 0
+
+
+class LocalLRUCache:
+    '''Кэш внутри процесса: не больше max_entries записей, LRU-вытеснение.'''
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires_at = self.entries.get(key, (MISSING, 0))
+            if value is MISSING:
+                return MISSING
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else min(
+            timeout, self.timeout
+        )
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TieredCache:
+    '''
+    Двухуровневый кэш: LocalLRUCache в каждом воркере перед общим
+    кэшем settings.TIERED_CACHE['ALIAS'].
+
+    Ключи живут в пространствах имен с версией: bump(namespace) делает
+    все ключи пространства недоступными без перебора. get_or_set()
+    пересчитывает значение в одном потоке на процесс и, через блокировку
+    в общем кэше, в одном процессе на кластер; остальные ждут результат.
+    '''
+    poll_interval = 0.05
+
+    def __init__(self, alias, local_max_entries, local_timeout,
+                 lock_timeout, stats_interval):
+        self.alias = alias
+        self.local = LocalLRUCache(local_max_entries, local_timeout)
+        self.lock_timeout = lock_timeout
+        self.stats = Counter()
+        self.stats_interval = stats_interval
+        self.stats_published_at = time.monotonic()
+        self.flights = {}
+        self.flights_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get_version(self, namespace):
+        version_key = f'version:{namespace}'
+        version = self.local.get(version_key)
+        if version is MISSING:
+            version = self.shared.get(version_key)
+            if version is None:
+                self.shared.add(version_key, 1, timeout=None)
+                version = self.shared.get(version_key, 1)
+            self.local.set(version_key, version)
+        return version
+
+    def bump(self, namespace):
+        version_key = f'version:{namespace}'
+        try:
+            version = self.shared.incr(version_key)
+        except ValueError:
+            version = 2
+            self.shared.set(version_key, version, timeout=None)
+        self.local.set(version_key, version)
+        return version
+
+    def reserve_version(self, namespace):
+        '''
+        Номер новой версии пространства, пока не видимый читателям:
+        данные под ним готовятся до publish_version().
+        '''
+        sequence_key = f'version_sequence:{namespace}'
+        self.shared.add(
+            sequence_key, self.shared.get(f'version:{namespace}', 1),
+            timeout=None
+        )
+        return self.shared.incr(sequence_key)
+
+    def publish_version(self, namespace, version):
+        '''Делает версию текущей, если более новая еще не опубликована.'''
+        version_key = f'version:{namespace}'
+        version = max(self.shared.get(version_key, 0), version)
+        self.shared.set(version_key, version, timeout=None)
+        self.local.set(version_key, version)
+        return version
+
+    def make_key(self, namespace, key):
+        digest = hashlib.md5(str(key).encode()).hexdigest()
+        return f'{namespace}:{self.get_version(namespace)}:{digest}'
+
+    def get(self, namespace, key, default=None):
+        full_key = self.make_key(namespace, key)
+        value = self.local.get(full_key)
+        if value is not MISSING:
+            self.stats['local_hits'] += 1
+            return value
+        value = self.shared.get(full_key, MISSING)
+        if value is not MISSING:
+            self.stats['shared_hits'] += 1
+            self.local.set(full_key, value)
+            return value
+        self.stats['misses'] += 1
+        return default
+
+    def set(self, namespace, key, value, timeout):
+        full_key = self.make_key(namespace, key)
+        self.shared.set(full_key, value, timeout)
+        self.local.set(full_key, value, timeout)
+
+    def get_or_set(self, namespace, key, compute, timeout):
+        value = self.get(namespace, key, MISSING)
+        if value is not MISSING:
+            return value
+        full_key = self.make_key(namespace, key)
+        with self.flights_lock:
+            flight = self.flights.setdefault(full_key, threading.Lock())
+        with flight:
+            try:
+                value = self.local.get(full_key)
+                if value is MISSING:
+                    value = self.compute_once(full_key, compute, timeout)
+            finally:
+                with self.flights_lock:
+                    self.flights.pop(full_key, None)
+        return value
+
+    def compute_once(self, full_key, compute, timeout):
+        lock_key = f'lock:{full_key}'
+        acquired = self.shared.add(lock_key, 1, self.lock_timeout)
+        if not acquired:
+            value = self.wait_for(full_key, timeout)
+            if value is not MISSING:
+                return value
+        try:
+            self.stats['computes'] += 1
+            value = compute()
+            self.shared.set(full_key, value, timeout)
+            self.local.set(full_key, value, timeout)
+            return value
+        finally:
+            if acquired:
+                self.shared.delete(lock_key)
+
+    def wait_for(self, full_key, timeout):
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.shared.get(full_key, MISSING)
+            if value is not MISSING:
+                self.stats['waits'] += 1
+                self.local.set(full_key, value, timeout)
+                return value
+        return MISSING
+
+    def get_stats(self):
+        '''Счетчики этого процесса с момента последней публикации.'''
+        stats = dict(self.stats)
+        stats['hit_ratio'] = get_hit_ratio(stats)
+        return stats
+
+    def publish_stats(self, force=False):
+        '''
+        Прибавляет счетчики процесса к общим в foodgram.metrics и
+        обнуляет их. Без force — не чаще stats_interval секунд, чтобы
+        запросы не платили за обращение к кэшу метрик.
+        '''
+        now = time.monotonic()
+        if not force and now - self.stats_published_at < self.stats_interval:
+            return
+        self.stats_published_at = now
+        stats, self.stats = self.stats, Counter()
+        for name, value in stats.items():
+            if value:
+                metrics.increment(STATS_PREFIX + name, value)
+
+
+def get_published_stats():
+    '''Общие счетчики TieredCache всех процессов из foodgram.metrics.'''
+    stats = {
+        name: metrics.get_value(STATS_PREFIX + name) for name in STAT_NAMES
+    }
+    stats['hit_ratio'] = get_hit_ratio(stats)
+    return stats
+
+
+tiered_cache = TieredCache(
+    alias=settings.TIERED_CACHE['ALIAS'],
+    local_max_entries=settings.TIERED_CACHE['LOCAL_MAX_ENTRIES'],
+    local_timeout=settings.TIERED_CACHE['LOCAL_TIMEOUT'],
+    lock_timeout=settings.TIERED_CACHE['LOCK_TIMEOUT'],
+    stats_interval=settings.TIERED_CACHE['STATS_INTERVAL'],
+)
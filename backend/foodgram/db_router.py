@@ -0,0 +1,59 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+PRIMARY_DB = 'default'
+
+replica_alias = ContextVar('replica_alias', default=None)
+
+
+def get_pin_cache():
+    return caches[settings.DATABASE_REPLICA_PIN_CACHE]
+
+
+def make_pin_key(user):
+    return f'db-primary-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    '''Направляет чтения пользователя на основную базу после записи.'''
+    get_pin_cache().set(
+        make_pin_key(user), True, settings.DATABASE_REPLICA_PIN_SECONDS
+    )
+
+
+def is_pinned_to_primary(user):
+    return user.is_authenticated and get_pin_cache().get(
+        make_pin_key(user), False
+    )
+
+
+def choose_replica(user):
+    '''
+    Возвращает реплику для чтений текущего запроса или None.
+
+    Реплика выбирается один раз на запрос, чтобы все запросы видели
+    одинаковое состояние данных. Пользователь, недавно писавший в базу,
+    остается на основной базе и видит свои изменения.
+    '''
+    if settings.DATABASE_REPLICAS and not is_pinned_to_primary(user):
+        return random.choice(settings.DATABASE_REPLICAS)
+    return None
+
+
+class ReplicaRouter:
+    '''Чтения идут на реплику из replica_alias, остальное — на primary.'''
+
+    def db_for_read(self, model, **hints):
+        return replica_alias.get() or PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
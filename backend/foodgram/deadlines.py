@@ -0,0 +1,92 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import DatabaseError, connections
+from django.db.utils import OperationalError
+
+# Код ошибки PostgreSQL query_canceled, которым завершается statement_timeout.
+QUERY_CANCELED = '57014'
+# Через сколько инструкций виртуальной машины SQLite проверять дедлайн.
+SQLITE_PROGRESS_STEPS = 10000
+
+
+class QueryDeadlineExceeded(OperationalError):
+    '''Бюджет времени запроса исчерпан до или во время SQL-запроса.'''
+
+
+def is_deadline_error(exc):
+    if isinstance(exc, QueryDeadlineExceeded):
+        return True
+    cause = exc.__cause__
+    return isinstance(exc, OperationalError) and (
+        getattr(cause, 'pgcode', None) == QUERY_CANCELED
+        or str(exc) == 'interrupted'
+    )
+
+
+class Deadline:
+    '''
+    Ограничивает SQL-запросы оставшимся бюджетом времени HTTP-запроса.
+
+    PostgreSQL получает statement_timeout перед каждым запросом, SQLite
+    прерывается через progress handler. Запрос, начатый после истечения
+    бюджета, сразу завершается QueryDeadlineExceeded.
+    '''
+
+    def __init__(self, budget):
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+        self.timeouts = set()
+
+    def set_budget(self, budget):
+        self.expires_at = self.started_at + budget
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise QueryDeadlineExceeded('Query deadline exceeded')
+        connection = context['connection']
+        cursor = getattr(context['cursor'], 'cursor', None)
+        if connection.vendor == 'postgresql' and not (
+                many or getattr(cursor, 'name', None)):
+            timeout = max(int(remaining * 1000), 1)
+            sql = f'SET statement_timeout = {timeout}; {sql}'
+            self.timeouts.add(connection.alias)
+        elif connection.vendor == 'sqlite':
+            connection.connection.set_progress_handler(
+                self.interrupt, SQLITE_PROGRESS_STEPS
+            )
+        return execute(sql, params, many, context)
+
+    def interrupt(self):
+        return self.remaining() <= 0
+
+    def reset(self):
+        for alias in connections:
+            connection = connections[alias]
+            if connection.connection is None:
+                continue
+            if connection.vendor == 'sqlite':
+                connection.connection.set_progress_handler(None, 0)
+            elif alias in self.timeouts:
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET statement_timeout = DEFAULT')
+                except DatabaseError:
+                    connection.close()
+
+
+@contextmanager
+def query_deadline(budget):
+    '''Применяет Deadline ко всем базам из settings.DATABASES.'''
+    deadline = Deadline(budget)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(deadline))
+            yield deadline
+    finally:
+        deadline.reset()
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+METRICS_PREFIX = 'metrics:'
+# Множество имен счетчиков: кэш не умеет перечислять ключи.
+NAMES_KEY = METRICS_PREFIX + '__names__'
+REGISTER_ATTEMPTS = 3
+NOT_SHARED_ERROR = (
+    'METRICS_CACHE is a LocMemCache: counters of the server processes are '
+    'not visible here. Set METRICS_CACHE_BACKEND to a shared cache.'
+)
+
+
+def get_cache():
+    return caches[settings.METRICS_CACHE]
+
+
+def is_shared():
+    '''LocMemCache виден только своему процессу, остальные бэкенды — всем.'''
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def register(cache, name):
+    '''
+    Добавляет имя в NAMES_KEY. Запись множества не атомарна: если
+    параллельная регистрация его затерла, повторяем.
+    '''
+    for _ in range(REGISTER_ATTEMPTS):
+        names = cache.get(NAMES_KEY, frozenset())
+        if name in names:
+            return
+        cache.set(NAMES_KEY, names | {name}, timeout=None)
+
+
+def increment(name, value=1):
+    '''Увеличивает счетчик в кэше settings.METRICS_CACHE.'''
+    cache = get_cache()
+    key = METRICS_PREFIX + name
+    if not cache.add(key, value, timeout=None):
+        try:
+            cache.incr(key, value)
+            return
+        except ValueError:
+            cache.set(key, value, timeout=None)
+    register(cache, name)
+
+
+def get_value(name):
+    return get_cache().get(METRICS_PREFIX + name, 0)
+
+
+def get_values(prefix=''):
+    '''Счетчики, имя которых начинается с prefix, по имени.'''
+    cache = get_cache()
+    names = sorted(
+        name for name in cache.get(NAMES_KEY, ()) if name.startswith(prefix)
+    )
+    values = cache.get_many([METRICS_PREFIX + name for name in names])
+    return {name: values.get(METRICS_PREFIX + name, 0) for name in names}
@@ -0,0 +1,194 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics
+from .db_router import pin_to_primary
+from .deadlines import is_deadline_error, query_deadline
+from .profiling import RequestProfile, profiler_lock
+from .slow_queries import SlowQueryRecorder
+from api.authentication import CachedTokenAuthentication
+
+logger = logging.getLogger(__name__)
+
+
+def get_endpoint(request, view_func):
+    '''Имя эндпоинта вида '<basename>.<action>', как в троттлинге.'''
+    initkwargs = getattr(view_func, 'initkwargs', None) or {}
+    actions = getattr(view_func, 'actions', None) or {}
+    basename = (initkwargs.get('basename')
+                or getattr(view_func, 'cls', view_func).__name__)
+    return f'{basename}.{actions.get(request.method.lower(), "default")}'
+
+
+class PrimaryPinMiddleware:
+    '''
+    После успешного изменяющего запроса закрепляет пользователя за
+    основной базой на DATABASE_REPLICA_PIN_SECONDS, чтобы следующие
+    чтения не попали на отстающую реплику. Представления, которые
+    только читают данные несмотря на метод (read_only = True у класса),
+    не закрепляют.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS
+                and not getattr(request, 'read_only', False)
+                and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.read_only = getattr(
+            getattr(view_func, 'cls', None), 'read_only', False
+        )
+
+
+class SlowQueryMiddleware:
+    '''
+    Записывает в SlowQuery запросы дольше SLOW_QUERIES['THRESHOLD_MS']
+    вместе с эндпоинтом. Записи (и выборочные EXPLAIN) сохраняются в
+    response.close(), который WSGI-сервер вызывает после отправки ответа:
+    клиент их не ждет, и они не входят в бюджет QueryDeadlineMiddleware.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        if recorder.queries:
+            close = response.close
+
+            def save_and_close():
+                try:
+                    self.save(recorder, request)
+                finally:
+                    close()
+
+            response.close = save_and_close
+        return response
+
+    @staticmethod
+    def save(recorder, request):
+        try:
+            recorder.save(getattr(request, 'endpoint', request.path))
+        except DatabaseError:
+            logger.exception('Failed to save slow queries')
+
+
+class QueryDeadlineMiddleware:
+    '''
+    Выдает каждому запросу бюджет времени на SQL из
+    REQUEST_TIME_BUDGETS['<basename>.<action>'] (по умолчанию
+    REQUEST_TIME_BUDGET). При исчерпании бюджета отвечает 503 с
+    Retry-After и увеличивает счетчик query_deadline_exceeded.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with query_deadline(settings.REQUEST_TIME_BUDGET) as deadline:
+            request.query_deadline = deadline
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.endpoint = get_endpoint(request, view_func)
+        budget = settings.REQUEST_TIME_BUDGETS.get(request.endpoint)
+        if budget is not None:
+            request.query_deadline.set_budget(budget)
+
+    def process_exception(self, request, exception):
+        if not is_deadline_error(exception):
+            return None
+        endpoint = getattr(request, 'endpoint', 'unknown')
+        logger.warning('Query deadline exceeded: %s %s (%s)',
+                       request.method, request.path, endpoint)
+        metrics.increment('query_deadline_exceeded')
+        metrics.increment(f'query_deadline_exceeded:{endpoint}')
+        response = JsonResponse(
+            {'detail': 'Сервер не успел обработать запрос, повторите позже.'},
+            status=503,
+            json_dumps_params={'ensure_ascii': False}
+        )
+        response['Retry-After'] = settings.REQUEST_DEADLINE_RETRY_AFTER
+        return response
+
+
+class ProfilerMiddleware:
+    '''
+    Профилирует запрос сотрудника (is_staff), пришедший с заголовком
+    PROFILER['HEADER']. Отчет (дерево вызовов, самые дорогие функции,
+    SQL по запросам) сохраняется в кэше, его id возвращается в
+    заголовке X-Profile-Id; прочитать отчет можно через
+    /api/profiles/<id>/.
+
+    Запросы без заголовка проходят без накладных расходов. Профилей не
+    больше PROFILER['RATE'] в минуту на сотрудника и одного
+    одновременно в процессе; остальные запросы выполняются как обычно.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILER['HEADER'].upper().replace(
+            '-', '_'
+        )
+
+    def __call__(self, request):
+        if (request.META.get(self.header) != '1'
+                or not self.is_allowed(request)):
+            return self.get_response(request)
+        if not profiler_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profile = RequestProfile()
+            with profile.run():
+                response = self.get_profiled_response(request)
+            profile.save(request, response, 'get_profiled_response')
+        finally:
+            profiler_lock.release()
+        response['X-Profile-Id'] = profile.id
+        return response
+
+    def get_profiled_response(self, request):
+        return self.get_response(request)
+
+    @staticmethod
+    def get_staff_user(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return user
+        try:
+            authenticated = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        if authenticated is None or not authenticated[0].is_staff:
+            return None
+        return authenticated[0]
+
+    def is_allowed(self, request):
+        user = self.get_staff_user(request)
+        if user is None:
+            return False
+        key = f'profiler-rate:{user.pk}'
+        cache.add(key, 0, 60)
+        try:
+            return cache.incr(key) <= settings.PROFILER['RATE']
+        except ValueError:
+            return False
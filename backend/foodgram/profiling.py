@@ -0,0 +1,199 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+from .slow_queries import get_query_shape
+
+PROFILE_KEY_PREFIX = 'profile:'
+
+# Профилировщик ставится на поток; одновременно в процессе
+# профилируется не больше одного запроса.
+profiler_lock = threading.Lock()
+
+
+def get_profile_cache():
+    return caches[settings.PROFILER['CACHE']]
+
+
+def make_profile_key(profile_id):
+    return PROFILE_KEY_PREFIX + profile_id
+
+
+def get_profile(profile_id):
+    return get_profile_cache().get(make_profile_key(profile_id))
+
+
+class QueryCollector:
+    '''execute_wrapper: время и число SQL-запросов по форме запроса.'''
+
+    def __init__(self):
+        self.queries = defaultdict(lambda: [0, 0.0])
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            query = self.queries[
+                (context['connection'].alias, get_query_shape(sql))
+            ]
+            query[0] += 1
+            query[1] += time.perf_counter() - started_at
+
+    def get_report(self):
+        limit = settings.PROFILER['TOP_QUERIES']
+        queries = sorted(
+            self.queries.items(), key=lambda item: item[1][1], reverse=True
+        )
+        return {
+            'count': sum(count for count, _ in self.queries.values()),
+            'duration_ms': round(sum(
+                duration for _, duration in self.queries.values()
+            ) * 1000, 3),
+            'queries': [{
+                'database': alias,
+                'sql': sql,
+                'count': count,
+                'duration_ms': round(duration * 1000, 3),
+            } for (alias, sql), (count, duration) in queries[:limit]],
+        }
+
+
+def get_function_name(function):
+    filename, line, name = function
+    if filename == '~':
+        return name
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            filename = filename[len(path) + 1:]
+            break
+    return f'{filename}:{line}({name})'
+
+
+class CallTree:
+    '''
+    Дерево вызовов из статистики cProfile. Каждая функция раскрывается
+    один раз (cProfile хранит граф, а не дерево: повторные вхождения
+    остаются листьями). Узлы, занявшие меньше PROFILER['TREE_MIN_SHARE']
+    общего времени, уровни глубже PROFILER['TREE_DEPTH'] и узлы сверх
+    PROFILER['TREE_MAX_NODES'] отбрасываются, поэтому размер отчета
+    ограничен независимо от размера запроса.
+    '''
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.children = defaultdict(dict)
+        for function, (*_, callers) in stats.items():
+            for caller, (_, calls, _, cumulative) in callers.items():
+                self.children[caller][function] = (calls, cumulative)
+
+    def build(self, root):
+        total = self.stats[root][3]
+        self.threshold = total * settings.PROFILER['TREE_MIN_SHARE']
+        self.nodes_left = settings.PROFILER['TREE_MAX_NODES'] - 1
+        self.expanded = set()
+        return self.get_node(
+            root, self.stats[root][1], total, settings.PROFILER['TREE_DEPTH']
+        )
+
+    def get_node(self, function, calls, cumulative, depth):
+        node = {
+            'function': get_function_name(function),
+            'calls': calls,
+            'total_ms': round(cumulative * 1000, 3),
+        }
+        if depth <= 0 or function in self.expanded:
+            return node
+        self.expanded.add(function)
+        children = sorted(
+            self.children[function].items(),
+            key=lambda item: item[1][1], reverse=True
+        )
+        node['children'] = []
+        for child, (child_calls, child_cumulative) in children:
+            if child_cumulative < self.threshold or self.nodes_left <= 0:
+                break
+            self.nodes_left -= 1
+            node['children'].append(self.get_node(
+                child, child_calls, child_cumulative, depth - 1
+            ))
+        return node
+
+
+def get_function_report(stats):
+    functions = sorted(
+        stats.items(), key=lambda item: item[1][2], reverse=True
+    )[:settings.PROFILER['TOP_FUNCTIONS']]
+    return [{
+        'function': get_function_name(function),
+        'calls': calls,
+        'own_ms': round(own * 1000, 3),
+        'total_ms': round(cumulative * 1000, 3),
+    } for function, (_, calls, own, cumulative, _) in functions]
+
+
+class RequestProfile:
+    '''
+    Профиль одного запроса: cProfile для Python-кода и QueryCollector
+    для SQL. Отчет сохраняется в кэше PROFILER['CACHE'] на
+    PROFILER['TIMEOUT'] секунд.
+    '''
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.profiler = cProfile.Profile()
+        self.queries = QueryCollector()
+
+    @contextmanager
+    def run(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(self.queries)
+                )
+            self.started_at = time.perf_counter()
+            self.cpu_started_at = time.thread_time()
+            self.profiler.enable()
+            try:
+                yield self
+            finally:
+                self.profiler.disable()
+                self.duration = time.perf_counter() - self.started_at
+                self.cpu_time = time.thread_time() - self.cpu_started_at
+
+    def get_report(self, request, response, root):
+        stats = pstats.Stats(self.profiler).stats
+        roots = [function for function in stats if function[2] == root]
+        return {
+            'id': self.id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'endpoint': getattr(request, 'endpoint', None),
+            'status': response.status_code,
+            'created_at': timezone.now().isoformat(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'cpu_ms': round(self.cpu_time * 1000, 3),
+            'sql': self.queries.get_report(),
+            'functions': get_function_report(stats),
+            'tree': CallTree(stats).build(
+                max(roots, key=lambda function: stats[function][3])
+            ) if roots else None,
+        }
+
+    def save(self, request, response, root):
+        get_profile_cache().set(
+            make_profile_key(self.id),
+            self.get_report(request, response, root),
+            settings.PROFILER['TIMEOUT']
+        )
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -43,6 +44,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.middleware.ProfilerMiddleware',
+    'foodgram.middleware.PrimaryPinMiddleware',
+    'foodgram.middleware.SlowQueryMiddleware',
+    'foodgram.middleware.QueryDeadlineMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -74,10 +79,159 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='True') == 'True',
     }
 }
 
+# Реплики для чтения через запятую: для PostgreSQL — хосты,
+# для SQLite — пути к файлам баз.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(',')),
+        start=1):
+    alias = f'replica_{number}'
+    replica_field = 'NAME' if 'sqlite3' in DATABASES['default']['ENGINE'] else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        replica_field: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Сколько секунд после записи читать данные пользователя с основной базы.
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.getenv('DB_REPLICA_PIN_SECONDS', default=10))
+# Кэш с закреплениями. Следующий запрос пользователя может попасть в
+# другой воркер, поэтому кэш должен быть общим для всех процессов.
+DATABASE_REPLICA_PIN_CACHE = 'shared'
+
+CACHES = {
+    # Служебное состояние (троттлинг, лимит профилировщика).
+    # LocMemCache живет внутри воркера: у каждого воркера свои ведра
+    # троттлинга, и фактический лимит умножается на число воркеров.
+    # В продакшене нужен общий бэкенд (Redis, Memcached).
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='default'),
+    },
+    # Общий уровень TieredCache (foodgram.cache); локально — файлы.
+    'shared': {
+        'BACKEND': os.getenv(
+            'SHARED_CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'SHARED_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SHARED_CACHE_MAX_ENTRIES', default=5000)),
+        },
+    },
+    # Счетчики foodgram.metrics, общие для всех процессов: команды
+    # metrics и cache_stats читают их из другого процесса. Без TIMEOUT
+    # и с большим MAX_ENTRIES, чтобы счетчики не вытеснялись.
+    # FileBasedCache увеличивает счетчики не атомарно, точные значения
+    # при нескольких воркерах дают Memcached или Redis.
+    'metrics': {
+        'BACKEND': os.getenv(
+            'METRICS_CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'METRICS_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_metrics')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Кэш token -> user для CachedTokenAuthentication. Должен быть общим
+    # для всех воркеров: logout и деактивация сбрасывают запись только
+    # в нем, и с LocMemCache другие воркеры принимали бы отозванный
+    # токен до истечения TIMEOUT. Локально — файлы, в продакшене лучше
+    # Redis или Memcached.
+    'auth': {
+        'BACKEND': os.getenv(
+            'AUTH_CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'AUTH_CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_auth')),
+        'TIMEOUT': int(os.getenv('AUTH_CACHE_TIMEOUT', default=60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('AUTH_CACHE_MAX_ENTRIES', default=10000)),
+        },
+    },
+}
+
+AUTH_TOKEN_CACHE = 'auth'
+
+METRICS_CACHE = 'metrics'
+
+TIERED_CACHE = {
+    'ALIAS': 'shared',
+    'LOCAL_MAX_ENTRIES': int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', default=1000)),
+    'LOCAL_TIMEOUT': int(os.getenv('LOCAL_CACHE_TIMEOUT', default=5)),
+    'LOCK_TIMEOUT': 10,
+    # Как часто воркер переносит счетчики попаданий в foodgram.metrics.
+    'STATS_INTERVAL': int(os.getenv('TIERED_CACHE_STATS_INTERVAL', default=10)),
+}
+
+# Похожие рецепты: число соседей, число рецептов, выше которого полный
+# пересчет идет через MinHash/LSH, параметры LSH и размер плотного блока
+# (в элементах) при точном расчете.
+SIMILAR_RECIPES = {
+    'TOP_K': 10,
+    'LSH_THRESHOLD': 20000,
+    'LSH_BANDS': 32,
+    'LSH_ROWS': 2,
+    'LSH_MAX_BUCKET': 1000,
+    'BLOCK_ELEMENTS': 10 ** 7,
+}
+
+# За сколько последних дней считается сортировка ordering=trending.
+POPULARITY_TRENDING_DAYS = 7
+
+# Время жизни закэшированных страниц ленты для анонимных пользователей.
+RECIPE_LIST_CACHE_TIMEOUT = 60
+
+# Профилирование запросов сотрудников (foodgram.middleware.ProfilerMiddleware):
+# заголовок, кэш и время хранения отчетов, профилей в минуту на сотрудника,
+# размеры дерева вызовов и списков функций и SQL-запросов в отчете.
+PROFILER = {
+    'HEADER': 'X-Profile',
+    'CACHE': 'shared',
+    'TIMEOUT': int(os.getenv('PROFILER_TIMEOUT', default=3600)),
+    'RATE': int(os.getenv('PROFILER_RATE', default=10)),
+    'TREE_DEPTH': 30,
+    'TREE_MAX_NODES': 300,
+    'TREE_MIN_SHARE': 0.01,
+    'TOP_FUNCTIONS': 30,
+    'TOP_QUERIES': 20,
+}
+
+# Медленные запросы (foodgram.middleware.SlowQueryMiddleware): порог,
+# доля запросов с EXPLAIN (ANALYZE, BUFFERS) на PostgreSQL и его
+# таймаут, записей на HTTP-запрос, сколько дней хранить записи.
+SLOW_QUERIES = {
+    'THRESHOLD_MS': float(os.getenv('SLOW_QUERY_THRESHOLD_MS', default=200)),
+    'EXPLAIN_SAMPLE_RATE': float(
+        os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', default=0.1)),
+    'EXPLAIN_TIMEOUT_MS': 5000,
+    'MAX_PER_REQUEST': 20,
+    'RETENTION_DAYS': 14,
+}
+
+# Каталог тегов и ингредиентов: файлы, которые воркеры узла отображают
+# в память (recipes.catalog). Каталог должен быть общим для воркеров.
+CATALOG_DIR = os.getenv(
+    'CATALOG_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram_catalog'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -117,13 +271,62 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.AnonTokenBucketThrottle',
+        'api.throttling.UserTokenBucketThrottle',
+        'api.throttling.ActionTokenBucketThrottle',
+    ],
+    # Адрес клиента для троттлинга берется из X-Forwarded-For, который
+    # добавляет nginx; без прокси заголовок не приходит и используется
+    # REMOTE_ADDR.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_RATE_ANON', default='300/min'),
+        'user': os.getenv('THROTTLE_RATE_USER', default='600/min'),
+        'action': os.getenv('THROTTLE_RATE_ACTION', default='240/min'),
+    },
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Стоимость запроса в токенах ведра, '<basename>.<action>'. Остальные
+# эндпоинты стоят 1 токен; списки умножаются на число страниц в ?limit=.
+THROTTLE_COSTS = {
+    'recipes.download_file': 30,
+    'ingredients.list': 3,
+    'users.subscriptions': 3,
+    'recipes.changes': 5,
+}
+
+# Бюджет времени на SQL в секундах для запроса, '<basename>.<action>'.
+REQUEST_TIME_BUDGET = float(os.getenv('REQUEST_TIME_BUDGET', default=10))
+REQUEST_TIME_BUDGETS = {
+    'recipes.list': 3,
+    'recipes.retrieve': 2,
+    'recipes.download_file': 5,
+    'ingredients.list': 1,
+    'users.subscriptions': 3,
+}
+REQUEST_DEADLINE_RETRY_AFTER = 5
+
+# Журнал изменений рецептов: сколько записей отдается за запрос и сколько
+# секунд новые записи не отдаются. Транзакция, начатая раньше, может
+# зафиксировать меньший id позже, и клиент с новым токеном его пропустит.
+RECIPE_CHANGES_BATCH_SIZE = 200
+RECIPE_CHANGES_SETTLE_SECONDS = REQUEST_TIME_BUDGET
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'email',
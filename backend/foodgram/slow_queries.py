@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import random
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+from api.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Списки параметров IN (%s, %s, ...) разной длины — один и тот же запрос.
+IN_PARAMS = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+# VALUES (...), (...) в bulk_create с разным числом строк.
+VALUES_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+SPACES = re.compile(r'\s+')
+
+
+def get_query_shape(sql):
+    '''Текст запроса без различий в числе параметров IN и строк VALUES.'''
+    return VALUES_ROWS.sub(
+        '(...)', IN_PARAMS.sub('(...)', SPACES.sub(' ', sql.strip()))
+    )
+
+
+def get_shape_hash(shape):
+    return hashlib.md5(shape.encode()).hexdigest()
+
+
+class SlowQueryRecorder:
+    '''
+    execute_wrapper: запоминает запросы дольше
+    SLOW_QUERIES['THRESHOLD_MS'] (не больше MAX_PER_REQUEST на запрос).
+    Параметры сохраняются только у выбранных для EXPLAIN запросов.
+    '''
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        failed = True
+        try:
+            result = execute(sql, params, many, context)
+            failed = False
+            return result
+        finally:
+            duration = (time.perf_counter() - started_at) * 1000
+            if (duration >= settings.SLOW_QUERIES['THRESHOLD_MS']
+                    and len(self.queries)
+                    < settings.SLOW_QUERIES['MAX_PER_REQUEST']):
+                explain = not (failed or many) and (
+                    random.random()
+                    < settings.SLOW_QUERIES['EXPLAIN_SAMPLE_RATE']
+                )
+                self.queries.append((
+                    context['connection'].alias, sql,
+                    params if explain else None, duration, explain
+                ))
+
+    @staticmethod
+    def explain(alias, sql, params):
+        '''
+        EXPLAIN (ANALYZE, BUFFERS) для SELECT на PostgreSQL. ANALYZE
+        выполняет запрос повторно, поэтому изменяющие запросы не
+        объясняются, а время ограничено SLOW_QUERIES['EXPLAIN_TIMEOUT_MS'].
+        '''
+        connection = connections[alias]
+        if (connection.vendor != 'postgresql'
+                or not sql.lstrip().upper().startswith('SELECT')):
+            return ''
+        try:
+            with transaction.atomic(using=alias):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SET LOCAL statement_timeout = %s',
+                        [settings.SLOW_QUERIES['EXPLAIN_TIMEOUT_MS']]
+                    )
+                    cursor.execute(
+                        f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params
+                    )
+                    return '\n'.join(row[0] for row in cursor.fetchall())
+        except DatabaseError as error:
+            logger.warning('EXPLAIN of a slow query failed: %s', error)
+            return ''
+
+    def save(self, endpoint):
+        if not self.queries:
+            return
+        records = []
+        for alias, sql, params, duration, explain in self.queries:
+            shape = get_query_shape(sql)
+            records.append(SlowQuery(
+                shape_hash=get_shape_hash(shape),
+                shape=shape,
+                endpoint=endpoint,
+                database=alias,
+                duration=duration,
+                plan=self.explain(alias, sql, params) if explain else '',
+            ))
+        SlowQuery.objects.bulk_create(records)
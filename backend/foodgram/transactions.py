@@ -0,0 +1,34 @@
+import weakref
+
+from django.db import transaction
+
+# Вызовы on_commit_once, ждущие фиксации: соединение -> {функция: weakref}.
+pending_callbacks = weakref.WeakKeyDictionary()
+
+
+class CommitCallback:
+    def __init__(self, func, callbacks):
+        self.func = func
+        self.callbacks = callbacks
+
+    def __call__(self):
+        self.callbacks.pop(self.func, None)
+        self.func()
+
+
+def on_commit_once(func, using=None):
+    '''
+    transaction.on_commit(func), если func уже не ждет фиксации текущей
+    транзакции. Сильную ссылку на зарегистрированный вызов держит только
+    Django: при откате транзакции или точки сохранения он отбрасывает
+    вызов, weakref умирает, и следующий on_commit_once регистрирует func
+    заново.
+    '''
+    connection = transaction.get_connection(using)
+    callbacks = pending_callbacks.setdefault(connection, {})
+    registered = callbacks.get(func)
+    if registered is not None and registered() is not None:
+        return
+    callback = CommitCallback(func, callbacks)
+    callbacks[func] = weakref.ref(callback)
+    transaction.on_commit(callback, using=using)
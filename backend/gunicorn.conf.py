@@ -0,0 +1,133 @@
+import gc
+import multiprocessing
+import os
+import time
+
+# Приложение загружается в мастере один раз; воркеры получают его через
+# fork и делят страницы памяти с мастером (copy-on-write).
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+preload_app = True
+worker_class = 'gthread'
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.getenv(
+    'GUNICORN_THREADS', default=max(2, multiprocessing.cpu_count() // 2)
+))
+# Перезапуск воркеров после max_requests запросов ограничивает рост
+# памяти; jitter разносит перезапуски воркеров во времени.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=2000))
+max_requests_jitter = int(os.getenv(
+    'GUNICORN_MAX_REQUESTS_JITTER', default=max_requests // 10
+))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+graceful_timeout = 30
+keepalive = 5
+
+
+def get_memory_usage():
+    '''RSS и приватная (не разделяемая с мастером) память процесса, МиБ.'''
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                key, value = line.split(':', 1)
+                if key in ('Rss', 'Private_Clean', 'Private_Dirty'):
+                    usage[key] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        usage['Rss'] = resource.getrusage(
+            resource.RUSAGE_SELF
+        ).ru_maxrss / 1024
+    usage['Private'] = (usage.get('Private_Clean', 0)
+                        + usage.get('Private_Dirty', 0))
+    return usage['Rss'], usage['Private']
+
+
+def warm_up(log):
+    '''
+    Заполняет в мастере ленивые структуры, которые иначе строил бы
+    каждый воркер на первых запросах: резолвер URL, сериализаторы
+    djoser, поля сериализаторов API и отображение каталога тегов и
+    ингредиентов. Каталог читается из базы; если она недоступна или
+    миграции еще не применены, мастер все равно стартует, а воркеры
+    соберут каталог на первом запросе.
+    '''
+    from django.db import DatabaseError, connections
+    from django.urls import get_resolver
+    from djoser.conf import settings as djoser_settings
+
+    from api import serializers
+    from recipes.catalog import catalog_store
+
+    get_resolver().reverse_dict
+    for name in ('user', 'user_create', 'current_user', 'token',
+                 'token_create', 'set_password'):
+        getattr(djoser_settings.SERIALIZERS, name)
+    for serializer_class in (
+            serializers.RecipeSerializer, serializers.RecipeEditSerializer,
+            serializers.ShortRecipeSerializer, serializers.TagSerializer,
+            serializers.IngredientSerializer, serializers.UserListSerializer,
+            serializers.SubscriptionSerializer):
+        serializer_class().fields
+    try:
+        catalog_store.get()
+    except (DatabaseError, OSError) as error:
+        log.warning('Catalog warm-up skipped: %s', error)
+    # Соединения с базой не должны переходить в воркеры через fork.
+    connections.close_all()
+
+
+def when_ready(server):
+    started_at = time.monotonic()
+    warm_up(server.log)
+    # Объекты, созданные до fork, переносятся в постоянное поколение:
+    # сборщик мусора воркеров не трогает их и не копирует страницы.
+    gc.freeze()
+    rss = get_memory_usage()[0]
+    server.log.info(
+        'Warm-up finished in %.1f ms, master RSS %.1f MiB, %d objects frozen',
+        (time.monotonic() - started_at) * 1000, rss, gc.get_freeze_count()
+    )
+
+
+def pre_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    rss, private = get_memory_usage()
+    worker.log.info(
+        'Worker %s ready in %.1f ms, RSS %.1f MiB, private %.1f MiB',
+        worker.pid, (time.monotonic() - worker.forked_at) * 1000,
+        rss, private
+    )
+    worker.first_request = True
+
+
+def pre_request(worker, req):
+    worker.request_started_at = time.monotonic()
+
+
+def post_request(worker, req, environ, resp):
+    if not getattr(worker, 'first_request', False):
+        return
+    worker.first_request = False
+    rss, private = get_memory_usage()
+    worker.log.info(
+        'Worker %s first request %s in %.1f ms, RSS %.1f MiB, '
+        'private %.1f MiB',
+        worker.pid, req.path,
+        (time.monotonic() - worker.request_started_at) * 1000, rss, private
+    )
+
+
+def worker_exit(server, worker):
+    from foodgram.cache import tiered_cache
+
+    tiered_cache.publish_stats(force=True)
+    rss, private = get_memory_usage()
+    server.log.info(
+        'Worker %s exiting, RSS %.1f MiB, private %.1f MiB',
+        worker.pid, rss, private
+    )
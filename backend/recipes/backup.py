@@ -0,0 +1,336 @@
+import gzip
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, time
+
+from django.apps import apps
+from django.contrib.auth.models import Permission
+from django.core.management.color import no_style
+from django.db import connections, models, transaction
+from django.utils import timezone
+
+from .catalog import refresh_catalog
+from .signals import RECIPES_CACHE_NAMESPACE
+from foodgram.cache import tiered_cache
+
+FORMAT_VERSION = 2
+# Версия 1 отличается только отсутствием групп и прав пользователей.
+READABLE_FORMATS = (1, 2)
+# Модели в порядке зависимостей внешних ключей. Права (auth.Permission)
+# создает migrate, их id в разных базах не совпадают: связи с правами
+# переносятся по натуральному ключу, см. BackupWriter.write_permissions.
+BACKUP_MODELS = (
+    'auth.Group', 'auth.Group_permissions',
+    'users.User', 'users.User_groups', 'users.User_user_permissions',
+    'authtoken.Token',
+    'recipes.Tag', 'recipes.Ingredient', 'recipes.Recipe',
+    'recipes.Recipe_tags', 'recipes.IngredientAmount',
+    'recipes.Subscription', 'recipes.FavoriteRecipe', 'recipes.ShoppingCart',
+    'recipes.RecipeChange', 'recipes.RecipePopularity',
+    'recipes.SimilarRecipe',
+)
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class BackupError(ValueError):
+    '''Файл резервной копии поврежден или не подходит для загрузки.'''
+
+
+def get_backup_models():
+    return [apps.get_model(label) for label in BACKUP_MODELS]
+
+
+def get_model_label(model):
+    return model._meta.label_lower
+
+
+def encode_value(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+@contextmanager
+def preserve_timestamps(backup_models):
+    '''
+    bulk_create заполняет поля auto_now и auto_now_add текущим временем;
+    при загрузке копии они должны сохранить значения из файла.
+    '''
+    fields = [
+        field for model in backup_models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def get_file_checksum(storage, name):
+    '''Имя, размер и sha256 файла из хранилища; None, если его нет.'''
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with storage.open(name, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+                size += len(block)
+    except FileNotFoundError:
+        return [name, None, None]
+    return [name, size, digest.hexdigest()]
+
+
+class BackupWriter:
+    '''
+    Пишет все BACKUP_MODELS в gzip-поток NDJSON. Строки читаются
+    .iterator() — на PostgreSQL через серверный курсор — пачками по
+    chunk_size и сразу сжимаются, поэтому память не зависит от размера
+    таблиц. Вся выгрузка идет в одной транзакции REPEATABLE READ, то
+    есть видит один снимок базы. Для файлов изображений рецептов
+    записываются размер и sha256.
+    '''
+
+    def __init__(self, stream, chunk_size, jobs, using):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.using = using
+        self.counts = {}
+
+    def write_record(self, record):
+        self.stream.write(json.dumps(
+            record, ensure_ascii=False, separators=(',', ':'),
+            default=encode_value
+        ))
+        self.stream.write('\n')
+
+    def write(self):
+        connection = connections[self.using]
+        with transaction.atomic(using=self.using):
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ'
+                    )
+            self.write_record({
+                'type': 'header',
+                'format': FORMAT_VERSION,
+                'created_at': timezone.now(),
+            })
+            self.write_permissions()
+            for model in get_backup_models():
+                self.write_model(model)
+            self.write_record({'type': 'end', 'counts': self.counts})
+        self.executor.shutdown()
+        return self.counts
+
+    def write_permissions(self):
+        '''id прав с натуральными ключами (app_label, model, codename).'''
+        self.write_record({
+            'type': 'permissions',
+            'permissions': list(Permission.objects.using(
+                self.using
+            ).order_by('pk').values_list(
+                'pk', 'content_type__app_label', 'content_type__model',
+                'codename'
+            )),
+        })
+
+    def write_model(self, model):
+        label = get_model_label(model)
+        fields = model._meta.concrete_fields
+        file_fields = [
+            index for index, field in enumerate(fields)
+            if isinstance(field, models.FileField)
+        ]
+        self.write_record({
+            'type': 'model',
+            'model': label,
+            'fields': [field.attname for field in fields],
+        })
+        rows = model._base_manager.using(self.using).order_by(
+            'pk'
+        ).values_list(
+            *(field.attname for field in fields)
+        ).iterator(chunk_size=self.chunk_size)
+        count = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                self.write_chunk(label, chunk, fields, file_fields)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            self.write_chunk(label, chunk, fields, file_fields)
+            count += len(chunk)
+        self.counts[label] = count
+
+    def write_chunk(self, label, chunk, fields, file_fields):
+        self.write_record({'type': 'rows', 'model': label, 'rows': chunk})
+        for index in file_fields:
+            storage = fields[index].storage
+            names = [row[index] for row in chunk if row[index]]
+            self.write_record({
+                'type': 'media',
+                'files': list(self.executor.map(
+                    lambda name: get_file_checksum(storage, name), names
+                )),
+            })
+
+
+class BackupReader:
+    '''
+    Загружает поток BackupWriter в пустую базу: bulk_create пачками в
+    одной транзакции с отложенной проверкой внешних ключей (как
+    loaddata), затем проверка ключей и сброс последовательностей.
+    С verify_media проверяет размер и sha256 файлов изображений.
+    '''
+
+    def __init__(self, stream, batch_size, jobs, using, verify_media):
+        self.stream = stream
+        self.permission_ids = {}
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.using = using
+        self.verify_media = verify_media
+        self.counts = {}
+        self.media_errors = []
+
+    def read(self):
+        connection = connections[self.using]
+        backup_models = {
+            get_model_label(model): model for model in get_backup_models()
+        }
+        for model in backup_models.values():
+            if model._base_manager.using(self.using).exists():
+                raise BackupError(
+                    f'{get_model_label(model)} is not empty, '
+                    f'load backups into an empty database'
+                )
+        with transaction.atomic(using=self.using):
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+            with connection.constraint_checks_disabled():
+                with preserve_timestamps(backup_models.values()):
+                    self.read_records(backup_models)
+            connection.check_constraints(table_names=[
+                model._meta.db_table for model in backup_models.values()
+            ])
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(), list(backup_models.values())):
+                    cursor.execute(sql)
+            transaction.on_commit(self.invalidate_caches, using=self.using)
+        self.executor.shutdown()
+        return self.counts
+
+    def read_records(self, backup_models):
+        header = json.loads(self.stream.readline() or '{}')
+        if (header.get('type') != 'header'
+                or header.get('format') not in READABLE_FORMATS):
+            raise BackupError('Unsupported backup format')
+        for line in self.stream:
+            record = json.loads(line)
+            if record['type'] == 'permissions':
+                self.map_permissions(record['permissions'])
+            elif record['type'] == 'model':
+                self.start_model(backup_models[record['model']], record)
+            elif record['type'] == 'rows':
+                self.load_rows(record['rows'])
+            elif record['type'] == 'media' and self.verify_media:
+                self.check_media(record['files'])
+            elif record['type'] == 'end':
+                if record['counts'] != self.counts:
+                    raise BackupError('Row counts do not match the backup')
+                return
+        raise BackupError('Backup is truncated')
+
+    def start_model(self, model, record):
+        self.model = model
+        self.label = record['model']
+        self.names = record['fields']
+        fields = [model._meta.get_field(name) for name in self.names]
+        self.converters = [
+            (index, field.to_python) for index, field in enumerate(fields)
+            if isinstance(field, (models.DateField, models.TimeField))
+        ]
+        self.file_field = next((
+            field for field in fields if isinstance(field, models.FileField)
+        ), None)
+        if 'permission_id' in self.names:
+            self.converters.append((
+                self.names.index('permission_id'), self.get_permission_id
+            ))
+        self.counts[self.label] = 0
+
+    def map_permissions(self, permissions):
+        '''id прав в копии -> id тех же прав в этой базе.'''
+        existing = {
+            tuple(key): pk for pk, *key in Permission.objects.using(
+                self.using
+            ).values_list(
+                'pk', 'content_type__app_label', 'content_type__model',
+                'codename'
+            )
+        }
+        self.permission_ids = {}
+        for pk, *key in permissions:
+            if tuple(key) in existing:
+                self.permission_ids[pk] = existing[tuple(key)]
+
+    def get_permission_id(self, pk):
+        try:
+            return self.permission_ids[pk]
+        except KeyError:
+            raise BackupError(
+                f'Permission {pk} from the backup does not exist, '
+                f'apply migrations before loading'
+            )
+
+    def load_rows(self, rows):
+        objects = []
+        for row in rows:
+            for index, convert in self.converters:
+                row[index] = convert(row[index])
+            objects.append(self.model(**dict(zip(self.names, row))))
+        self.model._base_manager.using(self.using).bulk_create(
+            objects, batch_size=self.batch_size
+        )
+        self.counts[self.label] += len(objects)
+
+    def check_media(self, files):
+        storage = self.file_field.storage
+        checked = self.executor.map(
+            lambda name: get_file_checksum(storage, name),
+            [name for name, _, _ in files]
+        )
+        for expected, actual in zip(files, checked):
+            if expected != actual:
+                self.media_errors.append(expected[0])
+
+    @staticmethod
+    def invalidate_caches():
+        tiered_cache.bump(RECIPES_CACHE_NAMESPACE)
+        refresh_catalog()
+
+
+def export_data(path, chunk_size, jobs, compresslevel, using):
+    with gzip.open(path, 'wt', encoding='utf-8',
+                   compresslevel=compresslevel) as stream:
+        return BackupWriter(stream, chunk_size, jobs, using).write()
+
+
+def import_data(path, batch_size, jobs, using, verify_media):
+    with gzip.open(path, 'rt', encoding='utf-8') as stream:
+        reader = BackupReader(stream, batch_size, jobs, using, verify_media)
+        return reader.read(), reader.media_errors
@@ -0,0 +1,304 @@
+import glob
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from django.conf import settings
+
+import numpy as np
+
+from foodgram.cache import tiered_cache
+from foodgram.db_router import PRIMARY_DB
+from foodgram.transactions import on_commit_once
+from recipes.models import Ingredient, Tag
+
+# Пространство имен TieredCache, версия которого — версия каталога.
+CATALOG_NAMESPACE = 'catalog'
+MAGIC = b'FGCATLG1'
+# Сигнатура, версия, число тегов, число ингредиентов.
+HEADER = struct.Struct('<8sQII')
+# Строки хранятся в общей области UTF-8: смещение и длина в байтах.
+TAG_DTYPE = np.dtype([
+    ('id', '<i8'), ('bit', '<i8'),
+    ('name', '<u4', 2), ('color', '<u4', 2), ('slug', '<u4', 2),
+])
+INGREDIENT_DTYPE = np.dtype([
+    ('id', '<i8'), ('name', '<u4', 2), ('measurement_unit', '<u4', 2),
+])
+POSITION_DTYPE = np.dtype('<u4')
+
+
+def get_catalog_path(version):
+    return os.path.join(settings.CATALOG_DIR, f'catalog-{version}.bin')
+
+
+class CatalogWriter:
+    '''Собирает файл каталога: заголовок, таблицы записей, строки.'''
+
+    def __init__(self):
+        self.strings = bytearray()
+
+    def add_string(self, value):
+        encoded = value.encode()
+        start = len(self.strings)
+        self.strings += encoded
+        return start, len(encoded)
+
+    def build(self, version):
+        tags = list(Tag.objects.using(PRIMARY_DB).order_by('id').values_list(
+            'id', 'bit', 'name', 'color', 'slug'
+        ))
+        ingredients = list(
+            Ingredient.objects.using(PRIMARY_DB).order_by('id').values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        tag_table = np.array([
+            (pk, bit, *map(self.add_string, strings))
+            for pk, bit, *strings in tags
+        ], dtype=TAG_DTYPE)
+        ingredient_table = np.array([
+            (pk, *map(self.add_string, strings))
+            for pk, *strings in ingredients
+        ], dtype=INGREDIENT_DTYPE)
+        # Порядок выдачи совпадает с Ingredient.Meta.ordering в базе;
+        # порядок поиска — по name.lower() для бинарного поиска префикса.
+        positions = {pk: index for index, (pk, *_) in enumerate(ingredients)}
+        ordered = np.array([
+            positions[pk] for pk in Ingredient.objects.using(
+                PRIMARY_DB
+            ).order_by('name', 'id').values_list('pk', flat=True)
+            if pk in positions
+        ], dtype=POSITION_DTYPE)
+        searchable = np.array(sorted(
+            range(len(ingredients)),
+            key=lambda index: ingredients[index][1].lower()
+        ), dtype=POSITION_DTYPE)
+        return b''.join((
+            HEADER.pack(MAGIC, version, len(tag_table), len(ingredient_table)),
+            tag_table.tobytes(), ingredient_table.tobytes(),
+            ordered.tobytes(), searchable.tobytes(), bytes(self.strings),
+        ))
+
+
+def write_catalog(version):
+    '''
+    Записывает каталог версии version во временный файл и атомарно
+    переименовывает его, так что читатели никогда не видят файл
+    наполовину.
+    '''
+    os.makedirs(settings.CATALOG_DIR, exist_ok=True)
+    data = CatalogWriter().build(version)
+    path = get_catalog_path(version)
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=settings.CATALOG_DIR, suffix='.tmp'
+    )
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return path
+
+
+def remove_old_catalogs(version):
+    '''
+    Удаляет файлы версий старше version. Воркеры, отобразившие прежний
+    файл, продолжают читать его до перехода на новую версию: отображение
+    остается валидным и после удаления файла.
+    '''
+    for old_path in glob.glob(get_catalog_path('*')):
+        old_version = os.path.basename(old_path)[len('catalog-'):-len('.bin')]
+        if old_version.isdigit() and int(old_version) < version:
+            try:
+                os.unlink(old_path)
+            except FileNotFoundError:
+                pass
+
+
+class Catalog:
+    '''
+    Теги и ингредиенты из файла, отображенного в память только для
+    чтения. Таблицы — представления numpy поверх mmap без копирования,
+    поэтому все воркеры узла делят одни и те же страницы page cache.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        magic, self.version, tag_count, ingredient_count = (
+            HEADER.unpack_from(self.buffer)
+        )
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalog file')
+        offset = HEADER.size
+        self.tags = np.frombuffer(self.buffer, TAG_DTYPE, tag_count, offset)
+        offset += self.tags.nbytes
+        self.ingredients = np.frombuffer(
+            self.buffer, INGREDIENT_DTYPE, ingredient_count, offset
+        )
+        offset += self.ingredients.nbytes
+        self.ordered = np.frombuffer(
+            self.buffer, POSITION_DTYPE, ingredient_count, offset
+        )
+        offset += self.ordered.nbytes
+        self.searchable = np.frombuffer(
+            self.buffer, POSITION_DTYPE, ingredient_count, offset
+        )
+        self.strings_offset = offset + self.searchable.nbytes
+        self.tag_ids = self.tags['id']
+        self.ingredient_ids = self.ingredients['id']
+
+    def get_string(self, position):
+        start = self.strings_offset + int(position[0])
+        return self.buffer[start:start + int(position[1])].decode()
+
+    def get_tag_data(self, row):
+        tag = self.tags[row]
+        return {
+            'id': int(tag['id']),
+            'name': self.get_string(tag['name']),
+            'color': self.get_string(tag['color']),
+            'slug': self.get_string(tag['slug']),
+        }
+
+    def get_ingredient_data(self, row):
+        ingredient = self.ingredients[row]
+        return {
+            'id': int(ingredient['id']),
+            'name': self.get_string(ingredient['name']),
+            'measurement_unit': self.get_string(
+                ingredient['measurement_unit']
+            ),
+        }
+
+    @staticmethod
+    def find(ids, pk):
+        row = int(np.searchsorted(ids, pk))
+        if row < len(ids) and ids[row] == pk:
+            return row
+        return None
+
+    def get_tag(self, pk):
+        row = self.find(self.tag_ids, pk)
+        return None if row is None else self.get_tag_data(row)
+
+    def get_ingredient(self, pk):
+        row = self.find(self.ingredient_ids, pk)
+        return None if row is None else self.get_ingredient_data(row)
+
+    def list_tags(self):
+        return [self.get_tag_data(row) for row in range(len(self.tags))]
+
+    def get_tags_by_bit(self):
+        return {
+            int(bit): self.get_tag_data(row)
+            for row, bit in enumerate(self.tags['bit'])
+        }
+
+    def get_ingredients(self, ids):
+        '''Словарь id -> ингредиент для найденных в каталоге id.'''
+        ingredients = {}
+        for pk in ids:
+            row = self.find(self.ingredient_ids, pk)
+            if row is not None:
+                ingredients[pk] = self.get_ingredient_data(row)
+        return ingredients
+
+    def get_search_key(self, index):
+        ingredient = self.ingredients[self.searchable[index]]
+        return self.get_string(ingredient['name']).lower()
+
+    def list_ingredients(self, prefixes=()):
+        '''
+        Ингредиенты в порядке Ingredient.Meta.ordering. С prefixes —
+        только те, чье название начинается (без учета регистра) с
+        каждого префикса, как SearchFilter с search_fields '^name'.
+        '''
+        prefixes = [prefix.lower() for prefix in prefixes]
+        if not prefixes:
+            return [self.get_ingredient_data(row) for row in self.ordered]
+        prefix = max(prefixes, key=len)
+        low, high = 0, len(self.searchable)
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_search_key(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        rows = []
+        for index in range(low, len(self.searchable)):
+            key = self.get_search_key(index)
+            if not key.startswith(prefix):
+                break
+            if all(key.startswith(other) for other in prefixes):
+                rows.append(self.searchable[index])
+        ranks = np.empty(len(self.ordered), dtype=np.int64)
+        ranks[self.ordered] = np.arange(len(self.ordered))
+        return [
+            self.get_ingredient_data(row)
+            for row in sorted(rows, key=lambda row: ranks[row])
+        ]
+
+
+class CatalogStore:
+    '''
+    Текущий Catalog процесса. Версия берется из TieredCache: после
+    refresh_catalog() воркеры переходят на новый файл не позже
+    TIERED_CACHE['LOCAL_TIMEOUT']. Файла нужной версии нет (другой узел,
+    очищенный каталог) — процесс собирает его сам.
+    '''
+
+    def __init__(self):
+        self.catalog = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = tiered_cache.get_version(CATALOG_NAMESPACE)
+        catalog = self.catalog
+        if catalog is not None and catalog.version == version:
+            return catalog
+        with self.lock:
+            if self.catalog is None or self.catalog.version != version:
+                self.catalog = self.load(version)
+            return self.catalog
+
+    @staticmethod
+    def load(version):
+        path = get_catalog_path(version)
+        try:
+            return Catalog(path)
+        except (OSError, ValueError):
+            return Catalog(write_catalog(version))
+
+
+catalog_store = CatalogStore()
+
+
+def refresh_catalog():
+    '''
+    Новая версия каталога. Версия публикуется только после записи файла:
+    иначе каждый воркер, увидевший ее раньше, собирал бы каталог из базы
+    сам.
+    '''
+    version = tiered_cache.reserve_version(CATALOG_NAMESPACE)
+    write_catalog(version)
+    remove_old_catalogs(
+        tiered_cache.publish_version(CATALOG_NAMESPACE, version)
+    )
+
+
+def schedule_catalog_refresh():
+    '''
+    Обновляет каталог после фиксации транзакции; несколько изменений
+    в одной транзакции (команда ingredients) дают одно обновление.
+    '''
+    on_commit_once(refresh_catalog)
@@ -0,0 +1,211 @@
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+
+from PIL import Image
+
+from .catalog import catalog_store
+from .models import IngredientAmount, Recipe
+from .signals import bump_recipes_cache, log_recipe_changes
+from foodgram.transactions import on_commit_once
+from users.models import User
+
+MAX_COOKING_TIME = 500
+
+
+class RecordError(ValueError):
+    '''Запись NDJSON не может быть импортирована.'''
+
+
+class RecipeImporter:
+    '''
+    Импорт рецептов из NDJSON: одна запись на строку вида
+    {"author": email или username, "name", "text", "cooking_time",
+    "tags": [slug, ...], "ingredients": [{"name", "measurement_unit",
+    "amount"}, ...], "image": путь к файлу}.
+
+    Теги и ингредиенты ищутся в каталоге recipes.catalog, авторы и уже
+    импортированные рецепты — одним запросом на пакет. Изображения
+    проверяются и сохраняются в хранилище параллельно, затем пакет
+    пишется bulk_create в одной транзакции: рецепты, связи с тегами
+    (с готовой tags_mask), IngredientAmount и журнал RecipeChange.
+    Рецепт автора с уже существующим названием пропускается, поэтому
+    повторный запуск на тех же данных ничего не дублирует.
+    '''
+
+    def __init__(self, images_dir, jobs):
+        self.images_dir = images_dir
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.image_field = Recipe._meta.get_field('image')
+        catalog = catalog_store.get()
+        self.tags = {
+            tag['slug']: (tag['id'], bit)
+            for bit, tag in catalog.get_tags_by_bit().items()
+        }
+        self.ingredients = {
+            (ingredient['name'], ingredient['measurement_unit']):
+                ingredient['id']
+            for ingredient in catalog.list_ingredients()
+        }
+        self.stats = Counter()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def parse(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise RecordError(f'invalid JSON: {error}')
+        if not isinstance(record, dict):
+            raise RecordError('record must be an object')
+        for field in ('author', 'name', 'text', 'image'):
+            if not isinstance(record.get(field), str) or not record[field]:
+                raise RecordError(f'{field} is required')
+        cooking_time = record.get('cooking_time')
+        if (not isinstance(cooking_time, int)
+                or not 1 <= cooking_time <= MAX_COOKING_TIME):
+            raise RecordError(
+                f'cooking_time must be from 1 to {MAX_COOKING_TIME}'
+            )
+        tags = []
+        for slug in record.get('tags') or ():
+            if slug not in self.tags:
+                raise RecordError(f'unknown tag {slug!r}')
+            tags.append(self.tags[slug])
+        if not tags:
+            raise RecordError('at least one tag is required')
+        record['tags'] = dict(tags)
+        record['ingredients'] = self.parse_ingredients(
+            record.get('ingredients')
+        )
+        return record
+
+    def parse_ingredients(self, items):
+        '''id ингредиента -> количество; повторы складываются.'''
+        amounts = Counter()
+        for item in items or ():
+            try:
+                key = (item['name'], item['measurement_unit'])
+                amount = item['amount']
+            except (KeyError, TypeError):
+                raise RecordError(
+                    'ingredient needs name, measurement_unit and amount'
+                )
+            if key not in self.ingredients:
+                raise RecordError(f'unknown ingredient {key[0]!r}, {key[1]}')
+            if not isinstance(amount, int) or amount < 1:
+                raise RecordError(f'invalid amount of {key[0]!r}')
+            amounts[self.ingredients[key]] += amount
+        if not amounts:
+            raise RecordError('at least one ingredient is required')
+        return amounts
+
+    def store_image(self, path):
+        '''Проверяет изображение и сохраняет его в хранилище рецептов.'''
+        path = os.path.join(self.images_dir, path)
+        try:
+            with Image.open(path) as image:
+                image.verify()
+            with open(path, 'rb') as file:
+                name = self.image_field.generate_filename(
+                    None, os.path.basename(path)
+                )
+                return self.image_field.storage.save(name, File(file))
+        except (OSError, SyntaxError, ValueError,
+                Image.DecompressionBombError) as error:
+            raise RecordError(f'invalid image {path}: {error}')
+
+    def get_authors(self, records):
+        names = {record['author'] for record in records}
+        authors = {}
+        for pk, email, username in User.objects.filter(
+                Q(email__in=names) | Q(username__in=names)
+        ).values_list('pk', 'email', 'username'):
+            authors[username] = pk
+            authors[email] = pk
+        return authors
+
+    def import_batch(self, records):
+        '''
+        Импортирует пакет [(номер строки, запись)]; возвращает ошибки
+        [(номер строки, текст)].
+        '''
+        errors = []
+        authors = self.get_authors([record for _, record in records])
+        pending = []
+        for line, record in records:
+            if record['author'] not in authors:
+                errors.append((line, f'unknown author {record["author"]!r}'))
+                continue
+            record['author_id'] = authors[record['author']]
+            pending.append((line, record))
+        existing = set(Recipe.objects.filter(
+            author_id__in={record['author_id'] for _, record in pending},
+            name__in={record['name'] for _, record in pending}
+        ).values_list('author_id', 'name'))
+        accepted = []
+        for line, record in pending:
+            key = (record['author_id'], record['name'])
+            if key in existing:
+                self.stats['skipped'] += 1
+                continue
+            existing.add(key)
+            accepted.append((line, record))
+        images = self.executor.map(
+            self.get_image_result, [record['image'] for _, record in accepted]
+        )
+        stored = []
+        for (line, record), (image, error) in zip(accepted, images):
+            if error is not None:
+                errors.append((line, error))
+                continue
+            record['image'] = image
+            stored.append(record)
+        try:
+            self.write(stored)
+        except BaseException:
+            for record in stored:
+                self.image_field.storage.delete(record['image'])
+            raise
+        self.stats['imported'] += len(stored)
+        self.stats['errors'] += len(errors)
+        return errors
+
+    def get_image_result(self, path):
+        try:
+            return self.store_image(path), None
+        except RecordError as error:
+            return None, str(error)
+
+    @transaction.atomic
+    def write(self, records):
+        if not records:
+            return
+        recipes = Recipe.objects.bulk_create(Recipe(
+            author_id=record['author_id'],
+            name=record['name'],
+            text=record['text'],
+            cooking_time=record['cooking_time'],
+            image=record['image'],
+            tags_mask=sum(1 << bit for bit in record['tags'].values()),
+        ) for record in records)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+            for recipe, record in zip(recipes, records)
+            for tag in record['tags']
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe_id=recipe.pk, ingredient_id=ingredient, amount=amount
+            )
+            for recipe, record in zip(recipes, records)
+            for ingredient, amount in record['ingredients'].items()
+        )
+        log_recipe_changes([recipe.pk for recipe in recipes])
+        on_commit_once(bump_recipes_cache)
@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from recipes.backup import export_data
+
+
+class Command(BaseCommand):
+    help = 'Export users and recipes to a gzip-compressed NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Output file path (.ndjson.gz)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched from the database and written per record'
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=os.cpu_count(),
+            help='Parallel media checksum threads'
+        )
+        parser.add_argument(
+            '--compresslevel',
+            type=int,
+            default=6,
+            choices=range(1, 10),
+            help='gzip compression level'
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to export from'
+        )
+
+    def handle(self, *args, **kwargs):
+        counts = export_data(
+            kwargs['path'], kwargs['chunk_size'], kwargs['jobs'],
+            kwargs['compresslevel'], kwargs['database']
+        )
+        for label, count in counts.items():
+            print(f'{label}: {count}')
+        print(f'Export {sum(counts.values())} rows completed successfully')
@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from recipes.backup import BackupError, import_data
+
+
+class Command(BaseCommand):
+    help = 'Import users and recipes exported by export_data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='File written by export_data'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per INSERT'
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=os.cpu_count(),
+            help='Parallel media checksum threads'
+        )
+        parser.add_argument(
+            '--verify-media',
+            action='store_true',
+            help='Check size and sha256 of every media file'
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to import into, must be empty'
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            counts, media_errors = import_data(
+                kwargs['path'], kwargs['batch_size'], kwargs['jobs'],
+                kwargs['database'], kwargs['verify_media']
+            )
+        except BackupError as error:
+            raise CommandError(error)
+        for label, count in counts.items():
+            print(f'{label}: {count}')
+        for name in media_errors:
+            self.stderr.write(f'Missing or changed media file: {name}')
+        print(f'Import {sum(counts.values())} rows completed successfully')
@@ -0,0 +1,98 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from recipes.ingestion import RecipeImporter, RecordError
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from an NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='NDJSON file, one recipe per line'
+        )
+        parser.add_argument(
+            '--images',
+            default='.',
+            help='Directory for relative image paths'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Recipes written per transaction'
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=os.cpu_count(),
+            help='Parallel image processing threads'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue after the last committed batch'
+        )
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+        progress_path = f'{path}.progress'
+        progress = {'offset': 0, 'line': 0}
+        if kwargs['resume'] and os.path.exists(progress_path):
+            with open(progress_path) as file:
+                progress = json.load(file)
+        importer = RecipeImporter(kwargs['images'], kwargs['jobs'])
+        started_at = time.monotonic()
+        try:
+            with open(path, 'rb') as file:
+                file.seek(progress['offset'])
+                while True:
+                    lines = list(islice(file, kwargs['batch_size']))
+                    if not lines:
+                        break
+                    self.import_batch(importer, lines, progress['line'])
+                    progress['offset'] += sum(map(len, lines))
+                    progress['line'] += len(lines)
+                    self.save_progress(progress_path, progress)
+                    stats = importer.stats
+                    elapsed = time.monotonic() - started_at
+                    print(f'Processed {progress["line"]} lines: '
+                          f'imported {stats["imported"]}, '
+                          f'skipped {stats["skipped"]}, '
+                          f'errors {stats["errors"]} '
+                          f'({stats["imported"] / elapsed:.0f} recipes/s)')
+        finally:
+            importer.close()
+        try:
+            os.remove(progress_path)
+        except FileNotFoundError:
+            pass
+        print(f'Import {importer.stats["imported"]} recipes '
+              f'completed successfully')
+
+    def import_batch(self, importer, lines, first_line):
+        records = []
+        errors = []
+        for line, text in enumerate(lines, first_line + 1):
+            if not text.strip():
+                continue
+            try:
+                records.append((line, importer.parse(text)))
+            except RecordError as error:
+                errors.append((line, str(error)))
+        importer.stats['errors'] += len(errors)
+        errors += importer.import_batch(records)
+        for line, error in sorted(errors):
+            self.stderr.write(f'Line {line}: {error}')
+
+    @staticmethod
+    def save_progress(path, progress):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(progress, file)
+        os.replace(temp_path, path)
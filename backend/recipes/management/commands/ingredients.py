@@ -2,6 +2,7 @@
 import csv
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from recipes.models import Ingredient
 
 
@@ -17,7 +18,8 @@ class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
         path = kwargs.get('path')
-        with open(path, 'rt', encoding='utf-8') as f:
+        # Одна транзакция: каталог (recipes.catalog) обновится один раз.
+        with open(path, 'rt', encoding='utf-8') as f, transaction.atomic():
             reader = csv.reader(f, dialect='excel')
             count = 0
             for row in reader:
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from recipes.models import RecipeChange, SimilarRecipesToken
+from recipes.similarity import rebuild_similar, refresh_similar
+
+# id единственной строки SimilarRecipesToken.
+TOKEN_ID = 1
+
+
+class Command(BaseCommand):
+    help = 'Build similar recipes index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Refresh only recipes changed since the previous run'
+        )
+
+    def handle(self, *args, **kwargs):
+        token = SimilarRecipesToken.objects.filter(pk=TOKEN_ID).values_list(
+            'change_id', flat=True
+        ).first() if kwargs['incremental'] else None
+        latest = RecipeChange.objects.filter(
+            changed_at__lte=timezone.now() - timedelta(
+                seconds=settings.RECIPE_CHANGES_SETTLE_SECONDS
+            )
+        ).aggregate(latest=Max('id'))['latest'] or 0
+        if token is None:
+            count = rebuild_similar()
+        else:
+            count = refresh_similar(RecipeChange.objects.filter(
+                id__gt=token, id__lte=latest
+            ).values_list('recipe_id', flat=True).distinct())
+        # Токен пишется после соседей: если команда прервется между
+        # ними, следующий запуск повторно пересчитает те же рецепты.
+        SimilarRecipesToken.objects.update_or_create(
+            pk=TOKEN_ID, defaults={'change_id': latest}
+        )
+        print(f'Stored {count} similar recipes')
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.6 on 2026-10-19 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_remove_ingredientamount_unique ingredient amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения рецепта'),
+        ),
+    ]
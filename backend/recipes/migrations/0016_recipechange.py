@@ -0,0 +1,38 @@
+# Generated by Django 4.1.6 on 2026-10-19 07:47
+
+from django.db import migrations, models
+
+
+def log_existing_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeChange = apps.get_model('recipes', 'RecipeChange')
+    RecipeChange.objects.bulk_create(
+        (RecipeChange(recipe_id=pk) for pk in
+         Recipe.objects.order_by('pk').values_list('pk', flat=True)),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.PositiveBigIntegerField(verbose_name='id рецепта')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Рецепт удален')),
+                ('changed_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Изменение рецепта',
+                'verbose_name_plural': 'Изменения рецептов',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.RunPython(log_existing_recipes, migrations.RunPython.noop),
+    ]
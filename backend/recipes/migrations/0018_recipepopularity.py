@@ -0,0 +1,70 @@
+# Generated by Django 4.1.6 on 2026-10-19 07:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def rollup_existing_relations(apps, schema_editor):
+    FavoriteRecipe = apps.get_model('recipes', 'FavoriteRecipe')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipePopularity = apps.get_model('recipes', 'RecipePopularity')
+    counters = {}
+    day = django.utils.timezone.localdate()
+    for model, field in ((FavoriteRecipe, 'favorites'),
+                         (ShoppingCart, 'shopping_carts')):
+        rows = model.objects.order_by().values('recipe_id').annotate(
+            count=models.Count('pk')
+        )
+        for row in rows:
+            popularity = counters.setdefault(
+                row['recipe_id'],
+                RecipePopularity(recipe_id=row['recipe_id'], day=day)
+            )
+            setattr(popularity, field, row['count'])
+    RecipePopularity.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('favorites', models.IntegerField(default=0, verbose_name='Добавлений в избранное')),
+                ('shopping_carts', models.IntegerField(default=0, verbose_name='Добавлений в списки покупок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+                'ordering': ('recipe', 'day'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipepopularity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'day'), name='unique recipe popularity day'),
+        ),
+        migrations.RunPython(
+            rollup_existing_relations, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.1.6 on 2026-10-19 07:55
+
+from django.db import migrations, models
+
+
+def fill_tags_masks(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    tags = list(Tag.objects.order_by('id'))
+    if len(tags) > 63:
+        raise ValueError('Не больше 63 тегов: маска тегов заполнена')
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ['bit'])
+    masks = {}
+    for recipe, bit in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag__bit'):
+        masks[recipe] = masks.get(recipe, 0) | 1 << bit
+    recipes = list(Recipe.objects.filter(pk__in=masks))
+    for recipe in recipes:
+        recipe.tags_mask = masks[recipe.pk]
+    Recipe.objects.bulk_update(recipes, ['tags_mask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_recipe_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_masks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, unique=True, verbose_name='Бит в маске тегов'),
+        ),
+    ]
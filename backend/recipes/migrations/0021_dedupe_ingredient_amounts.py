@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import Count, Min
+from django.utils import timezone
+
+
+def dedupe_ingredient_amounts(apps, schema_editor):
+    '''
+    Оставляет по одной записи (первой) на пару рецепт-ингредиент:
+    повторы накопились, пока ограничение было снято в 0014, и удваивали
+    количество в списке покупок, поэтому количества не складываются.
+    '''
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeChange = apps.get_model('recipes', 'RecipeChange')
+    duplicates = IngredientAmount.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        first_id=Min('id'), count=Count('id')
+    ).filter(count__gt=1)
+    recipes = set()
+    for duplicate in duplicates.iterator():
+        IngredientAmount.objects.filter(
+            recipe=duplicate['recipe'], ingredient=duplicate['ingredient']
+        ).exclude(id=duplicate['first_id']).delete()
+        recipes.add(duplicate['recipe'])
+    if not recipes:
+        return
+    Recipe.objects.filter(pk__in=recipes).update(updated_at=timezone.now())
+    RecipeChange.objects.bulk_create(
+        RecipeChange(recipe_id=recipe) for recipe in sorted(recipes)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_tags_mask'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            dedupe_ingredient_amounts, migrations.RunPython.noop
+        ),
+    ]
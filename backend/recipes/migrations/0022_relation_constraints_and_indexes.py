@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+from recipes.operations import AddIndexOnline, AddUniqueConstraintOnline
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся CONCURRENTLY, вне транзакции.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0021_dedupe_ingredient_amounts'),
+    ]
+
+    operations = [
+        AddUniqueConstraintOnline(
+            model_name='ingredientamount',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique ingredient amount'),
+        ),
+        AddIndexOnline(
+            model_name='favoriterecipe',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_idx'),
+        ),
+        AddIndexOnline(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shopping_cart_recipe_idx'),
+        ),
+        AddIndexOnline(
+            model_name='subscription',
+            index=models.Index(fields=['author', 'user'], name='subscription_author_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.6 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0022_relation_constraints_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipesToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('change_id', models.PositiveBigIntegerField(verbose_name='id изменения рецепта')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Токен похожих рецептов',
+                'verbose_name_plural': 'Токены похожих рецептов',
+            },
+        ),
+    ]
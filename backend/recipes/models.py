@@ -3,6 +3,9 @@ from django.core.validators import MinValueValidator
 
 from users.models import User
 
+# Число битов в Recipe.tags_mask: знаковый бит BigIntegerField не занимаем.
+TAGS_MASK_BITS = 63
+
 
 class Tag(models.Model):
     name = models.CharField('Название тега', max_length=200)
@@ -16,6 +19,11 @@ class Tag(models.Model):
         max_length=200,
         unique=True
     )
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов',
+        unique=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Тег'
@@ -72,15 +80,44 @@ class Recipe(models.Model):
         'Время приготовления',
         validators=(MinValueValidator(1, 'Минимум 1 минута'),)
     )
+    tags_mask = models.BigIntegerField(
+        'Маска тегов',
+        default=0,
+        editable=False
+    )
     pub_date = models.DateTimeField(
         'Дата публикации рецепта',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения рецепта',
+        auto_now=True
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'], name='recipe_cooking_time_idx'
+            ),
+            models.Index(fields=['name', 'id'], name='recipe_name_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'cooking_time', 'id'],
+                name='recipe_author_cooking_idx'
+            ),
+            models.Index(
+                fields=['author', 'name', 'id'], name='recipe_author_name_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Рецепт: {self.name}, автор: {self.author.username}'
@@ -107,12 +144,12 @@ class IngredientAmount(models.Model):
     class Meta:
         verbose_name = 'Количество ингредиента'
         verbose_name_plural = 'Количество ингредиентов'
-        # constraints = [
-        #     models.UniqueConstraint(
-        #         fields=('recipe', 'ingredient'),
-        #         name='unique ingredient amount'
-        #     )
-        # ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique ingredient amount'
+            )
+        ]
 
     def __str__(self):
         return (f'В рецепте {self.recipe.name} {self.amount} '
@@ -143,6 +180,11 @@ class Subscription(models.Model):
                 name='unique subscription'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='subscription_author_idx'
+            ),
+        ]
 
     def __str__(self):
         return (f'Пользователь: {self.user.username}, '
@@ -162,12 +204,18 @@ class FavoriteRecipe(models.Model):
         related_name='favorite_recipe',
         verbose_name='Избранный рецепт'
     )
+    created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         constraints = [
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
                 name='unique favorite')]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_idx'
+            ),
+        ]
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
         ordering = ('id',)
@@ -190,6 +238,7 @@ class ShoppingCart(models.Model):
         related_name='recipe_shopping_cart',
         verbose_name='Рецепт',
     )
+    created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         ordering = ('id',)
@@ -199,7 +248,116 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
                 name='unique shopping cart')]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='shopping_cart_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return (f'Пользователь: {self.user.username},'
                 f'рецепт в списке: {self.recipe.name}')
+
+
+class RecipeChange(models.Model):
+    '''
+    Журнал изменений рецептов для синхронизации клиентов: id записи
+    служит токеном изменений. Пишется сигналами в той же транзакции,
+    что и само изменение; удаление рецепта оставляет запись deleted.
+    '''
+    recipe_id = models.PositiveBigIntegerField('id рецепта')
+    deleted = models.BooleanField('Рецепт удален', default=False)
+    changed_at = models.DateTimeField('Дата изменения', auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Изменение рецепта'
+        verbose_name_plural = 'Изменения рецептов'
+
+    def __str__(self):
+        return f'Изменение {self.id}: рецепт {self.recipe_id}'
+
+
+class SimilarRecipe(models.Model):
+    '''
+    Предрасчитанные похожие рецепты: top-K соседей по коэффициенту
+    Жаккара между наборами ингредиентов. Заполняется командой
+    similar_recipes.
+    '''
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique similar recipe'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.similar_id}: {self.score:.2f}'
+
+
+class SimilarRecipesToken(models.Model):
+    '''
+    Последний id RecipeChange, учтенный в SimilarRecipe: с него
+    продолжает команда similar_recipes --incremental. Одна строка.
+    '''
+    change_id = models.PositiveBigIntegerField('id изменения рецепта')
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Токен похожих рецептов'
+        verbose_name_plural = 'Токены похожих рецептов'
+
+    def __str__(self):
+        return f'Похожие рецепты до изменения {self.change_id}'
+
+
+class RecipePopularity(models.Model):
+    '''
+    Дневные счетчики добавлений рецепта в избранное и в списки покупок.
+    Ведутся сигналами; сортировки popular и trending читают только их.
+    '''
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='popularity',
+        verbose_name='Рецепт'
+    )
+    day = models.DateField('День')
+    favorites = models.IntegerField('Добавлений в избранное', default=0)
+    shopping_carts = models.IntegerField(
+        'Добавлений в списки покупок', default=0
+    )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        ordering = ('recipe', 'day')
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'day'),
+                name='unique recipe popularity day'
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.recipe_id} {self.day}: {self.favorites} / '
+                f'{self.shopping_carts}')
@@ -0,0 +1,83 @@
+from django.db import NotSupportedError
+from django.db.migrations.operations import AddConstraint, AddIndex
+
+
+class OnlineOperationMixin:
+    '''
+    На PostgreSQL индекс строится CONCURRENTLY и не блокирует запись в
+    таблицу; на других базах операция выполняется как обычно.
+    CONCURRENTLY не работает в транзакции: миграции с такими
+    операциями объявляются atomic = False.
+    '''
+
+    @staticmethod
+    def is_online(schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return False
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                'CONCURRENTLY cannot be used inside a transaction, '
+                'set atomic = False on the migration.'
+            )
+        return True
+
+
+class AddIndexOnline(OnlineOperationMixin, AddIndex):
+    atomic = False
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.is_online(schema_editor):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        elif self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.is_online(schema_editor):
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        elif self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class AddUniqueConstraintOnline(OnlineOperationMixin, AddConstraint):
+    '''
+    UniqueConstraint по полям: на PostgreSQL сначала
+    CREATE UNIQUE INDEX CONCURRENTLY, затем ADD CONSTRAINT ... USING
+    INDEX, который только подключает готовый индекс. Недостроенный
+    индекс прошлой неудачной попытки удаляется.
+    '''
+    atomic = False
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.is_online(schema_editor):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        elif self.allow_migrate_model(schema_editor.connection.alias, model):
+            self.create_online(model, schema_editor)
+
+    def create_online(self, model, schema_editor):
+        quote = schema_editor.quote_name
+        name = quote(self.constraint.name)
+        table = quote(model._meta.db_table)
+        columns = ', '.join(
+            quote(model._meta.get_field(field).column)
+            for field in self.constraint.fields
+        )
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})'
+        )
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {name} '
+            f'UNIQUE USING INDEX {name}'
+        )
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FavoriteRecipe, RecipePopularity, ShoppingCart
+
+# Счетчик RecipePopularity для каждой связи пользователя с рецептом.
+POPULARITY_FIELDS = {
+    FavoriteRecipe: 'favorites',
+    ShoppingCart: 'shopping_carts',
+}
+
+
+def insert_relations(model, user, recipes):
+    '''
+    Добавляет связи model пользователя user с рецептами recipes и
+    возвращает id рецептов, строки которых вставлены этим вызовом.
+    Уже существующие связи, в том числе вставленные параллельным
+    запросом, пропускаются и не попадают в результат. Сигналы
+    post_save не отправляются.
+    '''
+    connection = connections[router.db_for_write(model)]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        return insert_relations_one_by_one(model, user, recipes, connection)
+    if not recipes:
+        return []
+    opts = model._meta
+    quote = connection.ops.quote_name
+    created_at = opts.get_field('created_at').get_db_prep_value(
+        timezone.now(), connection
+    )
+    columns = ', '.join(
+        quote(opts.get_field(name).column)
+        for name in ('user', 'recipe', 'created_at')
+    )
+    rows = ', '.join(['(%s, %s, %s)'] * len(recipes))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(opts.db_table)} ({columns}) '
+            f'VALUES {rows} ON CONFLICT DO NOTHING '
+            f'RETURNING {quote(opts.get_field("recipe").column)}',
+            [value for recipe in recipes
+             for value in (user, recipe, created_at)]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def insert_relations_one_by_one(model, user, recipes, connection):
+    '''insert_relations для баз без RETURNING: строка на точку сохранения.'''
+    added = []
+    for recipe in recipes:
+        try:
+            with transaction.atomic(using=connection.alias):
+                model.objects.using(connection.alias).bulk_create(
+                    [model(user_id=user, recipe_id=recipe)]
+                )
+        except IntegrityError:
+            continue
+        added.append(recipe)
+    return added
+
+
+def update_popularity(model, recipes, delta, day=None):
+    '''
+    Изменяет дневной счетчик связи model у рецептов recipes на delta.
+    Строки дня создаются только при добавлении: при удалении рецепта
+    его счетчики удаляются каскадом раньше, чем связи пользователей.
+    '''
+    field = POPULARITY_FIELDS[model]
+    day = day or timezone.localdate()
+    if delta > 0:
+        RecipePopularity.objects.bulk_create(
+            [RecipePopularity(recipe_id=recipe, day=day)
+             for recipe in recipes],
+            ignore_conflicts=True
+        )
+    RecipePopularity.objects.filter(recipe_id__in=recipes, day=day).update(
+        **{field: F(field) + delta}, updated_at=timezone.now()
+    )
+
+
+def annotate_popularity(queryset, days=None):
+    '''
+    Добавляет popularity_score: сумму счетчиков за последние days дней
+    (за все время, если days не задан).
+    '''
+    rollups = RecipePopularity.objects.filter(recipe=OuterRef('pk'))
+    if days:
+        rollups = rollups.filter(
+            day__gt=timezone.localdate() - timedelta(days=days)
+        )
+    score = rollups.order_by().values('recipe').annotate(
+        score=Sum(F('favorites') + F('shopping_carts'))
+    ).values('score')
+    return queryset.annotate(popularity_score=Coalesce(Subquery(score), 0))
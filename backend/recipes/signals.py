@@ -0,0 +1,205 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F, QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog import schedule_catalog_refresh
+from .models import (FavoriteRecipe, Ingredient, IngredientAmount, Recipe,
+                     RecipeChange, ShoppingCart, Subscription, Tag)
+from .popularity import update_popularity
+from .tag_masks import get_free_bit, update_tags_masks
+from foodgram.cache import tiered_cache
+from foodgram.transactions import on_commit_once
+from users.models import User
+
+# Пространство имен TieredCache с публичными данными рецептов.
+RECIPES_CACHE_NAMESPACE = 'recipes'
+
+
+def log_recipe_changes(recipes, deleted=False):
+    '''Добавляет записи в журнал изменений RecipeChange.'''
+    RecipeChange.objects.bulk_create([
+        RecipeChange(recipe_id=recipe, deleted=deleted) for recipe in recipes
+    ])
+
+
+def bump_recipes_cache():
+    tiered_cache.bump(RECIPES_CACHE_NAMESPACE)
+
+
+# Рецепты, накопленные recipe_changes(); None вне этого блока.
+touched_recipes = ContextVar('touched_recipes', default=None)
+
+
+def write_recipe_changes(recipes):
+    '''
+    Обновляет updated_at рецептов и записывает их в журнал в текущей
+    транзакции, вместе с самими изменениями. Кэш рецептов сбрасывается
+    после фиксации, один раз на транзакцию.
+    '''
+    recipes = list(Recipe.objects.filter(
+        pk__in=recipes
+    ).order_by('pk').values_list('pk', flat=True))
+    if not recipes:
+        return
+    Recipe.objects.filter(pk__in=recipes).update(updated_at=timezone.now())
+    log_recipe_changes(recipes)
+    on_commit_once(bump_recipes_cache)
+
+
+@contextmanager
+def recipe_changes():
+    '''
+    Копит рецепты, измененные внутри блока, и при успешном выходе
+    записывает их одним write_recipe_changes: одно обновление updated_at
+    и одна запись журнала на рецепт, сколько бы сигналов ни пришло.
+    Блок должен стоять внутри транзакции изменения; вложенные блоки
+    передают рецепты внешнему.
+    '''
+    if touched_recipes.get() is not None:
+        yield
+        return
+    recipes = set()
+    token = touched_recipes.set(recipes)
+    try:
+        yield
+    finally:
+        touched_recipes.reset(token)
+    write_recipe_changes(recipes)
+
+
+def touch_recipes(recipes):
+    '''
+    Обновляет updated_at рецептов без вызова save() и записывает
+    изменения в журнал: сразу или, внутри recipe_changes(), при выходе
+    из блока. recipes — id или queryset.
+    '''
+    if isinstance(recipes, QuerySet):
+        recipes = Recipe.objects.filter(pk__in=recipes).values_list(
+            'pk', flat=True
+        )
+    touched = touched_recipes.get()
+    if touched is None:
+        write_recipe_changes(recipes)
+    else:
+        touched.update(recipes)
+
+
+def touch_users(users):
+    '''
+    Обновляет updated_at пользователей и увеличивает state_version
+    без вызова save().
+    '''
+    User.objects.filter(pk__in=users).update(
+        updated_at=timezone.now(), state_version=F('state_version') + 1
+    )
+
+
+@receiver((post_save, post_delete), sender=IngredientAmount)
+def ingredient_amount_changed(sender, instance, **kwargs):
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipes = list(
+            instance.recipes.values_list('pk', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipes = [instance.pk]
+    elif action == 'post_clear':
+        recipes = instance.__dict__.pop('_cleared_recipes', [])
+    else:
+        recipes = pk_set
+    masks = update_tags_masks(recipes)
+    if not reverse:
+        # Иначе следующий instance.save() запишет прежнюю маску.
+        instance.tags_mask = masks[instance.pk]
+    touch_recipes(recipes)
+
+
+@receiver(pre_save, sender=Tag)
+def assign_tag_bit(sender, instance, **kwargs):
+    if instance.bit is None:
+        instance.bit = get_free_bit()
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(instance.recipes.values('pk'))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    '''Связи удалены каскадом без m2m_changed: освобождаем бит тега.'''
+    recipes = list(Recipe.objects.alias(
+        tag_bit=F('tags_mask').bitand(1 << instance.bit)
+    ).exclude(tag_bit=0).values_list('pk', flat=True))
+    update_tags_masks(recipes)
+    touch_recipes(recipes)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(
+            IngredientAmount.objects.filter(
+                ingredient=instance
+            ).values('recipe_id')
+        )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def catalog_changed(sender, instance, **kwargs):
+    schedule_catalog_refresh()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    touch_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    touch_users([instance.author_id])
+    log_recipe_changes([instance.pk], deleted=True)
+    on_commit_once(bump_recipes_cache)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        on_commit_once(bump_recipes_cache)
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipe)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def user_relation_changed(sender, instance, **kwargs):
+    touch_users([instance.user_id])
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_relation_saved(sender, instance, created, **kwargs):
+    if created:
+        update_popularity(sender, [instance.recipe_id], 1)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_relation_deleted(sender, instance, **kwargs):
+    update_popularity(
+        sender, [instance.recipe_id], -1,
+        timezone.localdate(instance.created_at)
+    )
@@ -0,0 +1,197 @@
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+
+import numpy as np
+from scipy import sparse
+
+from .models import IngredientAmount, Recipe, SimilarRecipe
+
+# Простое число Мерсенна для универсального хеширования MinHash:
+# a * x + b при a, x < 2 ** 31 помещается в int64.
+MERSENNE_PRIME = (1 << 31) - 1
+RANDOM_SEED = 42
+
+
+class IngredientVectors:
+    '''
+    Бинарная матрица рецепты × ингредиенты (scipy.sparse CSR),
+    построенная одним запросом к IngredientAmount. Сходство рецептов —
+    коэффициент Жаккара между наборами ингредиентов.
+    '''
+
+    def __init__(self):
+        pairs = IngredientAmount.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'
+        ).distinct()
+        pairs = np.fromiter(
+            chain.from_iterable(pairs.iterator()), dtype=np.int64
+        ).reshape(-1, 2)
+        self.recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        ingredient_ids, columns = np.unique(
+            pairs[:, 1], return_inverse=True
+        )
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+            shape=(len(self.recipe_ids), len(ingredient_ids))
+        )
+        self.sizes = np.diff(self.matrix.indptr).astype(np.float32)
+        self.top_k = settings.SIMILAR_RECIPES['TOP_K']
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def get_rows(self, recipes):
+        '''Номера строк матрицы для id рецептов, у которых она есть.'''
+        recipes = np.fromiter(recipes, dtype=np.int64)
+        rows = np.searchsorted(self.recipe_ids, recipes)
+        rows = rows[rows < len(self)]
+        return rows[np.isin(self.recipe_ids[rows], recipes)]
+
+    def get_neighbours(self, rows):
+        '''
+        Точный top-K для строк rows против всех рецептов. Плотный блок
+        пересечений ограничен SIMILAR_RECIPES['BLOCK_ELEMENTS'].
+        '''
+        block = max(
+            1, settings.SIMILAR_RECIPES['BLOCK_ELEMENTS'] // max(len(self), 1)
+        )
+        for start in range(0, len(rows), block):
+            chunk = rows[start:start + block]
+            intersections = (self.matrix[chunk] @ self.matrix.T).toarray()
+            scores = intersections / (
+                self.sizes[chunk, None] + self.sizes[None, :] - intersections
+            )
+            scores[np.arange(len(chunk)), chunk] = 0
+            yield from self.select_top(chunk, scores)
+
+    def select_top(self, rows, scores):
+        k = min(self.top_k, scores.shape[1] - 1)
+        if k <= 0:
+            return
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for row, columns, values in zip(rows, top, top_scores):
+            for column, score in zip(columns, values):
+                if score > 0:
+                    yield (int(self.recipe_ids[row]),
+                           int(self.recipe_ids[column]), float(score))
+
+    def get_signatures(self, size):
+        '''MinHash-сигнатуры строк: size хеш-функций вида (a * x + b) % p.'''
+        rng = np.random.default_rng(RANDOM_SEED)
+        a = rng.integers(1, MERSENNE_PRIME, size, dtype=np.int64)
+        b = rng.integers(0, MERSENNE_PRIME, size, dtype=np.int64)
+        columns = self.matrix.indices.astype(np.int64)
+        signatures = np.empty((len(self), size), dtype=np.int64)
+        block = max(1, settings.SIMILAR_RECIPES['BLOCK_ELEMENTS'] // size)
+        indptr = self.matrix.indptr
+        for start in range(0, len(self), block):
+            end = min(start + block, len(self))
+            hashes = (
+                columns[indptr[start]:indptr[end], None] * a + b
+            ) % MERSENNE_PRIME
+            signatures[start:end] = np.minimum.reduceat(
+                hashes, indptr[start:end] - indptr[start], axis=0
+            )
+        return signatures
+
+    def get_candidates(self):
+        '''
+        Пары строк-кандидатов по LSH: сигнатура делится на полосы, пары
+        с совпадающей полосой попадают в кандидаты. Корзины больше
+        LSH_MAX_BUCKET (самые частые ингредиенты) пропускаются.
+        '''
+        options = settings.SIMILAR_RECIPES
+        bands, band_rows = options['LSH_BANDS'], options['LSH_ROWS']
+        signatures = self.get_signatures(bands * band_rows).astype(np.uint64)
+        coefficients = np.random.default_rng(RANDOM_SEED).integers(
+            1, 1 << 62, band_rows, dtype=np.uint64
+        )
+        candidates = [np.empty((2, 0), dtype=np.int64)]
+        for band in range(bands):
+            keys = (signatures[:, band * band_rows:(band + 1) * band_rows]
+                    * coefficients).sum(axis=1)
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            ends = np.r_[starts[1:], len(keys)]
+            sizes = ends - starts
+            buckets = (sizes > 1) & (sizes <= options['LSH_MAX_BUCKET'])
+            for start, size in zip(starts[buckets], sizes[buckets]):
+                first, second = np.triu_indices(size, 1)
+                bucket = order[start:start + size]
+                candidates.append(np.stack((bucket[first], bucket[second])))
+        return np.unique(np.concatenate(candidates, axis=1), axis=1)
+
+    def get_lsh_neighbours(self):
+        '''Top-K для всех рецептов среди кандидатов LSH.'''
+        first, second = self.get_candidates()
+        intersections = np.asarray(
+            self.matrix[first].multiply(self.matrix[second]).sum(axis=1)
+        ).ravel()
+        scores = intersections / (
+            self.sizes[first] + self.sizes[second] - intersections
+        )
+        rows = np.concatenate((first, second))
+        columns = np.concatenate((second, first))
+        scores = np.concatenate((scores, scores))
+        order = np.lexsort((-scores, rows))
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        starts = np.searchsorted(rows, rows)
+        keep = (np.arange(len(rows)) - starts < self.top_k) & (scores > 0)
+        for row, column, score in zip(rows[keep], columns[keep],
+                                      scores[keep]):
+            yield (int(self.recipe_ids[row]), int(self.recipe_ids[column]),
+                   float(score))
+
+
+def store_similar(neighbours, recipes=None):
+    '''
+    Заменяет соседей рецептов recipes (всех рецептов, если None)
+    рассчитанными neighbours.
+    '''
+    stale = SimilarRecipe.objects.all()
+    if recipes is not None:
+        stale = stale.filter(recipe_id__in=recipes)
+    with transaction.atomic():
+        stale.delete()
+        existing = set(Recipe.objects.values_list('pk', flat=True))
+        return len(SimilarRecipe.objects.bulk_create(
+            (SimilarRecipe(recipe_id=recipe, similar_id=similar, score=score)
+             for recipe, similar, score in neighbours
+             if recipe in existing and similar in existing),
+            batch_size=1000
+        ))
+
+
+def rebuild_similar():
+    '''Полный пересчет; выше LSH_THRESHOLD рецептов — через MinHash/LSH.'''
+    vectors = IngredientVectors()
+    if len(vectors) > settings.SIMILAR_RECIPES['LSH_THRESHOLD']:
+        neighbours = vectors.get_lsh_neighbours()
+    else:
+        neighbours = vectors.get_neighbours(np.arange(len(vectors)))
+    return store_similar(neighbours)
+
+
+def refresh_similar(recipes):
+    '''
+    Пересчет для измененных рецептов, рецептов, у которых они были в
+    соседях, и их новых соседей. Остальные списки не меняются до
+    следующего полного пересчета.
+    '''
+    recipes = set(recipes)
+    vectors = IngredientVectors()
+    neighbours = list(vectors.get_neighbours(vectors.get_rows(recipes)))
+    affected = set(SimilarRecipe.objects.filter(
+        similar_id__in=recipes
+    ).values_list('recipe_id', flat=True))
+    affected |= {similar for _, similar, _ in neighbours}
+    affected -= recipes
+    neighbours += vectors.get_neighbours(vectors.get_rows(affected))
+    return store_similar(neighbours, recipes | affected)
@@ -0,0 +1,39 @@
+from collections import defaultdict
+
+from .models import TAGS_MASK_BITS, Recipe, Tag
+
+
+def get_tags_mask(tags):
+    '''Маска из битов тегов tags.'''
+    mask = 0
+    for tag in tags:
+        mask |= 1 << tag.bit
+    return mask
+
+
+def get_free_bit():
+    used = set(Tag.objects.values_list('bit', flat=True))
+    for bit in range(TAGS_MASK_BITS):
+        if bit not in used:
+            return bit
+    raise ValueError(
+        f'Не больше {TAGS_MASK_BITS} тегов: маска тегов заполнена'
+    )
+
+
+def update_tags_masks(recipes):
+    '''
+    Пересчитывает Recipe.tags_mask по таблице связей с тегами и
+    возвращает новые маски {id рецепта: маска}.
+    '''
+    recipes = set(recipes)
+    masks = dict.fromkeys(recipes, 0)
+    for recipe, bit in Recipe.tags.through.objects.filter(
+            recipe_id__in=recipes).values_list('recipe_id', 'tag__bit'):
+        masks[recipe] |= 1 << bit
+    groups = defaultdict(list)
+    for recipe, mask in masks.items():
+        groups[mask].append(recipe)
+    for mask, group in groups.items():
+        Recipe.objects.filter(pk__in=group).update(tags_mask=mask)
+    return masks
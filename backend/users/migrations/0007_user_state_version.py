@@ -0,0 +1,18 @@
+# Generated by Django 4.1.6 on 2026-10-19 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='state_version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Версия избранного, покупок и подписок'),
+        ),
+    ]
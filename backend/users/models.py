@@ -1,5 +1,32 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as AuthUserManager
 from django.db import models
+from django.dispatch import Signal
+
+# QuerySet.update() не вызывает post_save: об измененных им
+# пользователях сообщает этот сигнал с аргументом pks.
+users_updated = Signal()
+
+
+class UserQuerySet(models.QuerySet):
+    # Служебные поля, которые обновляются на каждое действие
+    # пользователя и не влияют на аутентификацию.
+    bookkeeping_fields = {'updated_at', 'state_version'}
+
+    def update(self, **kwargs):
+        if not set(kwargs) - self.bookkeeping_fields:
+            return super().update(**kwargs)
+        pks = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        if rows:
+            users_updated.send(sender=self.model, pks=pks)
+        return rows
+
+    update.alters_data = True
+
+
+class UserManager(AuthUserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -8,6 +35,12 @@ class User(AbstractUser):
     )
     first_name = models.CharField('Имя', max_length=150,)
     last_name = models.CharField('Фамилия', max_length=150,)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    state_version = models.PositiveBigIntegerField(
+        'Версия избранного, покупок и подписок', default=0
+    )
+
+    objects = UserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
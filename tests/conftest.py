@@ -0,0 +1,109 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.test import APIClient
+
+from foodgram.cache import tiered_cache
+from recipes.catalog import catalog_store
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientAmount,
+                            Recipe, ShoppingCart, Subscription, Tag)
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(settings, tmp_path):
+    '''Кэши, каталог и медиафайлы не переходят из теста в тест.'''
+    settings.CATALOG_DIR = str(tmp_path / 'catalog')
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    for cache in caches.all():
+        cache.clear()
+    tiered_cache.local.clear()
+    tiered_cache.stats.clear()
+    catalog_store.catalog = None
+    yield
+    catalog_store.catalog = None
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(
+        email='cook@example.com', username='cook', password='secret',
+        first_name='Иван', last_name='Поваров'
+    )
+
+
+@pytest.fixture
+def author(db):
+    return User.objects.create_user(
+        email='author@example.com', username='author', password='secret',
+        first_name='Анна', last_name='Авторова'
+    )
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast'),
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch'),
+        Tag.objects.create(name='Ужин', color='#8775D2', slug='dinner'),
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name='мука', measurement_unit='г'),
+        Ingredient.objects.create(name='молоко', measurement_unit='мл'),
+        Ingredient.objects.create(name='яйца', measurement_unit='шт.'),
+    ]
+
+
+def create_recipe(author, name, tags, ingredients, cooking_time=10):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=f'Как готовить {name}',
+        cooking_time=cooking_time, image=f'recipes/images/{name}.png'
+    )
+    recipe.tags.set(tags)
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    recipe.refresh_from_db()
+    return recipe
+
+
+def get_recipe_data(recipe, tags):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': (
+            'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAA'
+            'ABAAEAAAIBRAA7'
+        ),
+        'tags': [tag.pk for tag in tags],
+        'ingredients': [
+            {'id': amount.ingredient_id, 'amount': amount.amount}
+            for amount in recipe.recipe.all()
+        ],
+    }
+
+
+@pytest.fixture
+def recipes(user, author, tags, ingredients):
+    flour, milk, eggs = ingredients
+    recipes = [
+        create_recipe(author, 'Блины', tags[:1], [(flour, 200), (milk, 500)]),
+        create_recipe(author, 'Омлет', tags[:2], [(eggs, 3), (milk, 50)], 5),
+        create_recipe(user, 'Лапша', tags[1:], [(flour, 300)], 40),
+    ]
+    FavoriteRecipe.objects.create(user=user, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[1])
+    Subscription.objects.create(user=user, author=author)
+    return recipes
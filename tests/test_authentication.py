@@ -0,0 +1,59 @@
+import pytest
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import get_token_cache, make_token_cache_key
+from recipes.signals import touch_users
+from users.models import User
+
+ME_URL = '/api/users/me/'
+
+
+@pytest.fixture
+def token(user):
+    return Token.objects.create(user=user)
+
+
+@pytest.fixture
+def token_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    assert client.get(ME_URL).status_code == 200
+    assert get_token_cache().get(make_token_cache_key(token.key))
+    return client
+
+
+@pytest.mark.django_db
+def test_logout_revokes_cached_token(token_client):
+    assert token_client.post('/api/auth/token/logout/').status_code == 204
+    assert token_client.get(ME_URL).status_code == 401
+
+
+@pytest.mark.django_db
+def test_deactivation_by_save_revokes_cached_token(token_client, user):
+    user.is_active = False
+    user.save()
+    assert token_client.get(ME_URL).status_code == 401
+
+
+@pytest.mark.django_db
+def test_deactivation_by_update_revokes_cached_token(token_client, user):
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    assert token_client.get(ME_URL).status_code == 401
+
+
+@pytest.mark.django_db
+def test_inactive_user_in_cache_is_rejected(token_client, token):
+    cache = get_token_cache()
+    cache_key = make_token_cache_key(token.key)
+    cached = cache.get(cache_key)
+    cached.user.is_active = False
+    cache.set(cache_key, cached)
+    assert token_client.get(ME_URL).status_code == 401
+    assert cache.get(cache_key) is None
+
+
+@pytest.mark.django_db
+def test_bookkeeping_updates_keep_cached_token(token_client, token, user):
+    touch_users([user.pk])
+    assert get_token_cache().get(make_token_cache_key(token.key))
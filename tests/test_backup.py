@@ -0,0 +1,46 @@
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.backup import export_data, get_backup_models, import_data
+from recipes.models import Recipe, RecipeChange
+from users.models import User
+
+
+def clear_backup_models():
+    for model in reversed(get_backup_models()):
+        model._base_manager.all().delete()
+    # Удаление рецептов само пишет журнал изменений.
+    RecipeChange.objects.all().delete()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_backup_roundtrip_keeps_groups_and_permissions(
+        tmp_path, user, recipes):
+    permission = Permission.objects.get(codename='change_recipe')
+    group = Group.objects.create(name='Модераторы')
+    group.permissions.add(permission)
+    user.groups.add(group)
+    user.user_permissions.add(permission)
+    path = str(tmp_path / 'backup.ndjson.gz')
+    exported = export_data(path, 100, 2, 1, DEFAULT_DB_ALIAS)
+    assert exported['auth.group_permissions'] == 1
+    assert exported['users.user_groups'] == 1
+
+    clear_backup_models()
+    # В другой базе у тех же прав другие id.
+    content_type, codename, name = (
+        permission.content_type, permission.codename, permission.name
+    )
+    permission.delete()
+    permission = Permission.objects.create(
+        content_type=content_type, codename=codename, name=name
+    )
+
+    counts, media_errors = import_data(path, 100, 2, DEFAULT_DB_ALIAS, False)
+    assert counts == exported
+    user = User.objects.get(pk=user.pk)
+    assert list(user.groups.values_list('name', flat=True)) == ['Модераторы']
+    assert list(user.user_permissions.all()) == [permission]
+    assert list(Group.objects.get().permissions.all()) == [permission]
+    assert Recipe.objects.count() == len(recipes)
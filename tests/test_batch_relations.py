@@ -0,0 +1,43 @@
+import pytest
+from django.db import connection
+
+from recipes.models import FavoriteRecipe, RecipePopularity
+from recipes.popularity import insert_relations
+
+
+@pytest.fixture(params=[True, False], ids=['returning', 'savepoints'])
+def returning(request, monkeypatch):
+    monkeypatch.setattr(
+        type(connection.features), 'can_return_rows_from_bulk_insert',
+        request.param
+    )
+
+
+@pytest.mark.django_db
+def test_insert_relations_skips_existing_rows(returning, user, recipes):
+    '''Строку recipes[0] уже вставил другой запрос: ее нет в результате.'''
+    added = insert_relations(
+        FavoriteRecipe, user.pk, [recipe.pk for recipe in recipes]
+    )
+    assert sorted(added) == [recipes[1].pk, recipes[2].pk]
+    assert FavoriteRecipe.objects.filter(user=user).count() == 3
+    assert insert_relations(FavoriteRecipe, user.pk, [recipes[1].pk]) == []
+
+
+@pytest.mark.django_db
+def test_batch_counts_only_inserted_favorites(user_client, recipes):
+    popularity = dict(RecipePopularity.objects.values_list(
+        'recipe_id', 'favorites'
+    ))
+    for _ in range(2):
+        response = user_client.post('/api/recipes/favorite/', {
+            'recipes': [recipe.pk for recipe in recipes]
+        }, format='json')
+        assert response.status_code == 201
+    assert dict(RecipePopularity.objects.values_list(
+        'recipe_id', 'favorites'
+    )) == {
+        recipes[0].pk: popularity[recipes[0].pk],
+        recipes[1].pk: popularity.get(recipes[1].pk, 0) + 1,
+        recipes[2].pk: popularity.get(recipes[2].pk, 0) + 1,
+    }
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings as django_settings
+from django.core.management import CommandError, call_command
+
+# Воркер в отдельном процессе: промах, затем попадание в локальный кэш.
+WORKER_SCRIPT = '''
+import django
+django.setup()
+from foodgram.cache import tiered_cache
+tiered_cache.get_or_set('test', 'cache-stats', lambda: 1, 60)
+tiered_cache.get_or_set('test', 'cache-stats', lambda: 1, 60)
+tiered_cache.publish_stats(force=True)
+'''
+
+
+def test_cache_stats_shows_counters_of_other_processes(capsys):
+    subprocess.run(
+        [sys.executable, '-c', WORKER_SCRIPT],
+        check=True,
+        cwd=django_settings.BASE_DIR,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'foodgram.settings'},
+    )
+    call_command('cache_stats')
+    output = capsys.readouterr().out
+    assert 'local_hits: 1' in output
+    assert 'misses: 1' in output
+    assert 'hit_ratio: 50.0%' in output
+
+
+def test_cache_stats_refuses_process_local_cache(settings):
+    settings.METRICS_CACHE = 'default'
+    with pytest.raises(CommandError):
+        call_command('cache_stats')
@@ -0,0 +1,152 @@
+import os
+
+import pytest
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from api.serializers import IngredientSerializer, TagSerializer
+from foodgram.cache import tiered_cache
+from recipes.catalog import (CATALOG_NAMESPACE, CatalogStore,
+                             get_catalog_path)
+from recipes.models import Ingredient, Tag
+
+TAGS_URL = '/api/tags/'
+INGREDIENTS_URL = '/api/ingredients/'
+
+
+def get_json(url, **params):
+    response = APIClient().get(url, params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def get_catalog_version():
+    return tiered_cache.get_version(CATALOG_NAMESPACE)
+
+
+@pytest.fixture
+def more_ingredients(ingredients):
+    return ingredients + [
+        Ingredient.objects.create(name=name, measurement_unit=unit)
+        for name, unit in (
+            ('Морковь', 'г'), ('молоко топленое', 'мл'), ('соль', 'г'),
+            ('Мускатный орех', 'г'),
+        )
+    ]
+
+
+@pytest.mark.django_db
+def test_tags_match_serializer(tags):
+    assert get_json(TAGS_URL) == TagSerializer(
+        Tag.objects.order_by('id'), many=True
+    ).data
+    for tag in tags:
+        assert get_json(f'{TAGS_URL}{tag.pk}/') == TagSerializer(tag).data
+
+
+@pytest.mark.django_db
+def test_ingredients_match_serializer(more_ingredients):
+    assert get_json(INGREDIENTS_URL) == IngredientSerializer(
+        Ingredient.objects.all(), many=True
+    ).data
+    for ingredient in more_ingredients:
+        assert get_json(
+            f'{INGREDIENTS_URL}{ingredient.pk}/'
+        ) == IngredientSerializer(ingredient).data
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('search', ['мо', 'МО', 'мол', 'молоко т', 'м о',
+                                    'х', ''])
+def test_ingredient_search(more_ingredients, search):
+    '''Как SearchFilter с '^name': каждое слово — префикс без регистра.'''
+    terms = search.lower().split()
+    expected = [
+        ingredient for ingredient in IngredientSerializer(
+            Ingredient.objects.all(), many=True
+        ).data
+        if all(ingredient['name'].lower().startswith(term) for term in terms)
+    ]
+    assert get_json(INGREDIENTS_URL, name=search) == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', [TAGS_URL, INGREDIENTS_URL])
+def test_missing_catalog_objects(tags, ingredients, url):
+    client = APIClient()
+    assert client.get(f'{url}100000/').status_code == 404
+    assert client.get(f'{url}abc/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_catalog_reads_without_queries(tags, ingredients,
+                                       django_assert_num_queries):
+    get_json(TAGS_URL)
+    with django_assert_num_queries(0):
+        get_json(TAGS_URL)
+        get_json(f'{TAGS_URL}{tags[0].pk}/')
+        get_json(INGREDIENTS_URL, name='мо')
+        get_json(f'{INGREDIENTS_URL}{ingredients[0].pk}/')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_after_tag_changes(tags):
+    get_json(TAGS_URL)
+    tags[0].name = 'Поздний завтрак'
+    tags[0].save()
+    Tag.objects.create(name='Десерт', color='#F0A0A0', slug='dessert')
+    names = [tag['name'] for tag in get_json(TAGS_URL)]
+    assert names == ['Поздний завтрак', 'Обед', 'Ужин', 'Десерт']
+    tags[1].delete()
+    assert APIClient().get(f'{TAGS_URL}{tags[1].pk}/').status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_refresh_after_ingredient_changes(ingredients):
+    get_json(INGREDIENTS_URL)
+    version = get_catalog_version()
+    with transaction.atomic():
+        ingredients[0].measurement_unit = 'кг'
+        ingredients[0].save()
+        created = Ingredient.objects.create(
+            name='масло', measurement_unit='г'
+        )
+    # Несколько изменений в транзакции — одно обновление каталога.
+    assert get_catalog_version() == version + 1
+    assert get_json(f'{INGREDIENTS_URL}{ingredients[0].pk}/')[
+        'measurement_unit'
+    ] == 'кг'
+    assert get_json(INGREDIENTS_URL, name='ма') == [
+        IngredientSerializer(created).data
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_no_refresh_after_rollback(tags):
+    get_json(TAGS_URL)
+    version = get_catalog_version()
+    with pytest.raises(RuntimeError), transaction.atomic():
+        Tag.objects.create(name='Десерт', color='#F0A0A0', slug='dessert')
+        raise RuntimeError
+    assert get_catalog_version() == version
+    assert len(get_json(TAGS_URL)) == len(tags)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_workers_share_published_file(tags, settings,
+                                      django_assert_num_queries):
+    '''
+    Другой процесс открывает уже записанный файл новой версии, не
+    собирая каталог из базы; файлы прежних версий удалены.
+    '''
+    get_json(TAGS_URL)
+    tags[0].name = 'Поздний завтрак'
+    tags[0].save()
+    version = get_catalog_version()
+    assert os.listdir(settings.CATALOG_DIR) == [
+        os.path.basename(get_catalog_path(version))
+    ]
+    with django_assert_num_queries(0):
+        catalog = CatalogStore().get()
+    assert catalog.version == version
+    assert catalog.get_tag(tags[0].pk)['name'] == 'Поздний завтрак'
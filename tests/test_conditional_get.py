@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import FavoriteRecipe, IngredientAmount, Recipe
+from users.models import User
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.fixture
+def old_recipes(recipes):
+    '''Валидаторы из прошлого, чтобы правки сдвигали Last-Modified.'''
+    past = timezone.now() - timedelta(hours=1)
+    Recipe.objects.update(updated_at=past)
+    User.objects.update(updated_at=past)
+    return recipes
+
+
+@pytest.mark.django_db
+def test_retrieve_not_modified(old_recipes):
+    client = APIClient()
+    url = f'{RECIPES_URL}{old_recipes[0].pk}/'
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response['ETag']
+    last_modified = response['Last-Modified']
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert client.get(
+        url, HTTP_IF_MODIFIED_SINCE=last_modified
+    ).status_code == 304
+
+
+@pytest.mark.django_db
+def test_retrieve_modified_after_change(old_recipes):
+    client = APIClient()
+    url = f'{RECIPES_URL}{old_recipes[0].pk}/'
+    response = client.get(url)
+    for amount in IngredientAmount.objects.filter(recipe=old_recipes[0]):
+        amount.amount = 1
+        amount.save()
+    for headers in (
+        {'HTTP_IF_NONE_MATCH': response['ETag']},
+        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+    ):
+        changed = client.get(url, **headers)
+        assert changed.status_code == 200
+        assert changed['ETag'] != response['ETag']
+        assert {item['amount'] for item in changed.json()['ingredients']} == {
+            1
+        }
+
+
+@pytest.mark.django_db
+def test_retrieve_deleted_recipe(old_recipes):
+    client = APIClient()
+    url = f'{RECIPES_URL}{old_recipes[0].pk}/'
+    etag = client.get(url)['ETag']
+    old_recipes[0].delete()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 404
+
+
+@pytest.mark.django_db
+def test_list_etag_changes_after_delete(old_recipes):
+    '''
+    Удаление не сдвигает Max(updated_at) оставшихся рецептов: список
+    отдается без Last-Modified, и ETag меняется вместе с числом рецептов.
+    '''
+    client = APIClient()
+    response = client.get(RECIPES_URL)
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response
+    assert client.get(
+        RECIPES_URL, HTTP_IF_NONE_MATCH=response['ETag']
+    ).status_code == 304
+    Recipe.objects.filter(pk=old_recipes[2].pk).delete()
+    Recipe.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+    changed = client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert changed.status_code == 200
+    assert changed['ETag'] != response['ETag']
+    assert changed.json()['count'] == len(old_recipes) - 1
+    assert client.get(
+        RECIPES_URL, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2029 00:00:00 GMT'
+    ).status_code == 200
+
+
+@pytest.mark.django_db
+def test_list_etag_depends_on_viewer(old_recipes, user, user_client):
+    etag = user_client.get(RECIPES_URL)['ETag']
+    assert APIClient().get(RECIPES_URL)['ETag'] != etag
+    FavoriteRecipe.objects.create(user=user, recipe=old_recipes[1])
+    changed = user_client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200
+    assert changed['ETag'] != etag
+    assert 'Authorization' in changed['Vary']
+
+
+@pytest.mark.django_db
+def test_user_retrieve_not_modified(old_recipes, author):
+    client = APIClient()
+    url = f'/api/users/{author.pk}/'
+    response = client.get(url)
+    assert response.status_code == 200
+    assert client.get(
+        url, HTTP_IF_NONE_MATCH=response['ETag']
+    ).status_code == 304
+    author.first_name = 'Мария'
+    author.save()
+    changed = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert changed.status_code == 200
+    assert changed.json()['first_name'] == 'Мария'
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.urls import path
+
+from foodgram import metrics
+from foodgram.deadlines import (Deadline, QueryDeadlineExceeded,
+                                is_deadline_error, query_deadline)
+
+# Считает до 10 ** 9 — на SQLite это много секунд.
+SLOW_SQL = (
+    'WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL '
+    'SELECT n + 1 FROM numbers WHERE n < 1000000000) '
+    'SELECT count(*) FROM numbers'
+)
+only_sqlite = pytest.mark.skipif(
+    connection.vendor != 'sqlite', reason='SQLite progress handler'
+)
+
+
+def slow_view(request):
+    with connection.cursor() as cursor:
+        cursor.execute(SLOW_SQL)
+    return HttpResponse()
+
+
+urlpatterns = [path('slow/', slow_view)]
+
+
+def make_context(vendor, cursor_name=None):
+    return {
+        'connection': SimpleNamespace(vendor=vendor, alias='default'),
+        'cursor': SimpleNamespace(cursor=SimpleNamespace(name=cursor_name)),
+    }
+
+
+def execute(sql, params, many, context):
+    return sql
+
+
+def test_postgres_queries_get_statement_timeout():
+    deadline = Deadline(2)
+    sql = deadline(execute, 'SELECT 1', None, False, make_context('postgresql'))
+    prefix, query = sql.split('; ')
+    assert query == 'SELECT 1'
+    assert prefix.startswith('SET statement_timeout = ')
+    assert 1900 < int(prefix.rsplit(' ', 1)[1]) <= 2000
+    assert deadline.timeouts == {'default'}
+
+
+@pytest.mark.parametrize('many, cursor_name', [(True, None), (False, 'c1')])
+def test_executemany_and_named_cursors_are_not_prefixed(many, cursor_name):
+    deadline = Deadline(2)
+    sql = deadline(execute, 'SELECT 1', None, many,
+                   make_context('postgresql', cursor_name))
+    assert sql == 'SELECT 1'
+
+
+def test_query_after_deadline_is_rejected():
+    deadline = Deadline(0)
+    with pytest.raises(QueryDeadlineExceeded):
+        deadline(execute, 'SELECT 1', None, False, make_context('postgresql'))
+
+
+@only_sqlite
+@pytest.mark.django_db
+def test_sqlite_query_interrupted_at_deadline():
+    with pytest.raises(OperationalError) as error, query_deadline(0.05):
+        with connection.cursor() as cursor:
+            cursor.execute(SLOW_SQL)
+    assert is_deadline_error(error.value)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+@only_sqlite
+@pytest.mark.django_db
+def test_slow_query_returns_503(client, settings, capsys):
+    settings.ROOT_URLCONF = __name__
+    settings.REQUEST_TIME_BUDGETS = {'slow_view.default': 0.05}
+    response = client.get('/slow/')
+    assert response.status_code == 503
+    assert response['Retry-After'] == str(
+        settings.REQUEST_DEADLINE_RETRY_AFTER
+    )
+    call_command('metrics', 'query_deadline_exceeded')
+    assert capsys.readouterr().out.splitlines() == [
+        'query_deadline_exceeded: 1',
+        'query_deadline_exceeded:slow_view.default: 1',
+    ]
+
+
+def test_metrics_command_refuses_process_local_cache(settings):
+    settings.METRICS_CACHE = 'default'
+    metrics.increment('query_deadline_exceeded')
+    with pytest.raises(CommandError):
+        call_command('metrics')
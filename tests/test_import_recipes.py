@@ -0,0 +1,29 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Recipe
+
+
+@pytest.mark.django_db
+def test_import_empty_file(tmp_path, tags):
+    path = tmp_path / 'recipes.ndjson'
+    path.write_text('')
+    call_command('import_recipes', str(path))
+    assert not Recipe.objects.exists()
+    assert not (tmp_path / 'recipes.ndjson.progress').exists()
+
+
+@pytest.mark.django_db
+def test_import_reports_invalid_records(tmp_path, author, tags, capsys):
+    path = tmp_path / 'recipes.ndjson'
+    path.write_text('\n'.join([
+        'not json',
+        json.dumps({'author': author.email, 'name': 'Суп'}),
+    ]))
+    call_command('import_recipes', str(path))
+    errors = capsys.readouterr().err
+    assert 'Line 1: invalid JSON' in errors
+    assert 'Line 2: text is required' in errors
+    assert not (tmp_path / 'recipes.ndjson.progress').exists()
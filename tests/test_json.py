@@ -0,0 +1,122 @@
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+
+import pytest
+from django.utils.translation import gettext_lazy
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, is_orjson_safe
+
+RECIPE_PAGE = {
+    'count': 2,
+    'next': None,
+    'previous': None,
+    'results': [{
+        'id': pk,
+        'tags': [{'id': 1, 'name': 'Завтрак', 'color': '#E26C2D',
+                  'slug': 'breakfast'}],
+        'author': {'id': 3, 'email': 'anna@example.com', 'username': 'anna',
+                   'first_name': 'Анна', 'last_name': 'Авторова',
+                   'is_subscribed': False},
+        'ingredients': [{'id': 7, 'name': 'мука', 'measurement_unit': 'г',
+                         'amount': 200}],
+        'is_favorited': True,
+        'is_in_shopping_cart': False,
+        'name': f'Блины {pk}',
+        'image': None,
+        'text': 'Смешать «всё» и жарить.\n\tГотово!',
+        'cooking_time': 30,
+    } for pk in (1, 2)],
+}
+PAYLOADS = {
+    'recipe page': RECIPE_PAGE,
+    'decimal': {'amount': Decimal('1.10'), 'big': Decimal('1E+16')},
+    'datetime': {
+        'aware': datetime(2023, 2, 14, 21, 23, 5, 123456, timezone.utc),
+        'naive': datetime(2023, 2, 14, 21, 23, 5, 123456),
+        'date': date(2023, 2, 14),
+        'time': time(21, 23, 5, 123456),
+        'duration': timedelta(minutes=90),
+    },
+    'uuid': {'id': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+    'lazy string': {'detail': gettext_lazy('User inactive or deleted.')},
+    'line separators': {'text': 'a\u2028b\u2029c'},
+    'control characters': {'text': ''.join(map(chr, range(32))) + '\x7f'},
+    'floats': {'values': [0.1, 1e16, 1e-07, -0.0, 1.0]},
+    'big int': {'id': 2 ** 70},
+    'non-string keys': {1: 'one', None: 'none', True: 'true'},
+    'tuple and set': {'tuple': (1, 2), 'set': {3}},
+    'nan': {'value': float('nan')},
+    'infinity': {'value': float('-inf')},
+    'empty': {},
+}
+
+
+def render_both(data, media_type=None, **attrs):
+    results = []
+    for renderer_class in (JSONRenderer, FastJSONRenderer):
+        renderer = type('Renderer', (renderer_class,), attrs)()
+        try:
+            results.append(renderer.render(data, media_type, {}))
+        except (TypeError, ValueError) as error:
+            results.append((type(error), str(error)))
+    return results
+
+
+@pytest.mark.parametrize('data', PAYLOADS.values(), ids=PAYLOADS.keys())
+@pytest.mark.parametrize('media_type, attrs', [
+    (None, {}),
+    (None, {'strict': False}),
+    (None, {'ensure_ascii': True}),
+    (None, {'compact': False}),
+    ('application/json; indent=4', {}),
+], ids=['default', 'not strict', 'ensure_ascii', 'not compact', 'indent'])
+def test_renderer_matches_drf(data, media_type, attrs):
+    expected, actual = render_both(data, media_type, **attrs)
+    assert actual == expected
+
+
+def test_strict_json_rejects_nan():
+    for result in render_both({'value': float('nan')}):
+        assert result[0] is ValueError
+
+
+def test_recipe_page_uses_orjson():
+    assert is_orjson_safe([RECIPE_PAGE])
+    assert not is_orjson_safe([PAYLOADS['floats']])
+
+
+BODIES = {
+    'recipe': (
+        '{"name": "Блины", "tags": [1, 2], "cooking_time": 30, '
+        '"ingredients": [{"id": 7, "amount": 200}], "image": null}'
+    ).encode(),
+    'float': b'{"amount": 0.1, "big": 1e16}',
+    'big int': b'{"id": 123456789012345678901234567890}',
+    'nan': b'{"value": NaN}',
+    'infinity': b'{"value": 1e400}',
+    'invalid': b'{"name": }',
+    'lone surrogate': b'{"name": "\\ud800"}',
+}
+
+
+def parse_both(body, **attrs):
+    results = []
+    for parser_class in (JSONParser, FastJSONParser):
+        parser = type('Parser', (parser_class,), attrs)()
+        try:
+            results.append(parser.parse(BytesIO(body)))
+        except Exception as error:
+            results.append((type(error), str(error)))
+    return results
+
+
+@pytest.mark.parametrize('body', BODIES.values(), ids=BODIES.keys())
+@pytest.mark.parametrize('strict', [True, False], ids=['strict', 'not strict'])
+def test_parser_matches_drf(body, strict):
+    expected, actual = parse_both(body, strict=strict)
+    assert repr(actual) == repr(expected)
@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+import pytest
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import FavoriteRecipe, RecipePopularity, ShoppingCart
+from users.models import User
+
+RECIPES_URL = '/api/recipes/'
+
+
+def get_totals(recipe):
+    return RecipePopularity.objects.filter(recipe=recipe).aggregate(
+        favorites=Sum('favorites'), shopping_carts=Sum('shopping_carts')
+    )
+
+
+def get_ordered_ids(ordering):
+    response = APIClient().get(
+        RECIPES_URL, {'ordering': ordering, 'fields': 'id'}
+    )
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+@pytest.fixture
+def fans(db):
+    return [
+        User.objects.create_user(
+            email=f'fan{number}@example.com', username=f'fan{number}',
+            password='secret', first_name='Фанат', last_name=str(number)
+        )
+        for number in range(3)
+    ]
+
+
+@pytest.mark.django_db
+def test_rollup_counts_relations(recipes, user, author):
+    assert get_totals(recipes[0]) == {'favorites': 1, 'shopping_carts': 0}
+    assert get_totals(recipes[1]) == {'favorites': 0, 'shopping_carts': 1}
+    FavoriteRecipe.objects.create(user=author, recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[0])
+    assert get_totals(recipes[0]) == {'favorites': 2, 'shopping_carts': 1}
+    FavoriteRecipe.objects.filter(recipe=recipes[0]).delete()
+    ShoppingCart.objects.filter(recipe=recipes[1]).delete()
+    assert get_totals(recipes[0]) == {'favorites': 0, 'shopping_carts': 1}
+    assert get_totals(recipes[1]) == {'favorites': 0, 'shopping_carts': 0}
+
+
+@pytest.mark.django_db
+def test_rollup_through_api(user_client, recipes):
+    user_client.post(f'{RECIPES_URL}{recipes[2].pk}/favorite/')
+    user_client.post(f'{RECIPES_URL}{recipes[2].pk}/favorite/')
+    user_client.post(f'{RECIPES_URL}{recipes[2].pk}/shopping_cart/')
+    assert get_totals(recipes[2]) == {'favorites': 1, 'shopping_carts': 1}
+    user_client.delete(f'{RECIPES_URL}{recipes[2].pk}/favorite/')
+    user_client.delete(f'{RECIPES_URL}{recipes[2].pk}/favorite/')
+    user_client.delete(
+        f'{RECIPES_URL}shopping_cart/',
+        {'recipes': [recipes[1].pk, recipes[2].pk]}, format='json'
+    )
+    assert get_totals(recipes[1]) == {'favorites': 0, 'shopping_carts': 0}
+    assert get_totals(recipes[2]) == {'favorites': 0, 'shopping_carts': 0}
+
+
+@pytest.mark.django_db
+def test_rollup_decrements_day_of_addition(recipes, user):
+    '''Удаление старой связи уменьшает счетчик дня ее добавления.'''
+    old_day = timezone.localdate() - timedelta(days=10)
+    FavoriteRecipe.objects.filter(recipe=recipes[0]).update(
+        created_at=timezone.now() - timedelta(days=10)
+    )
+    RecipePopularity.objects.filter(recipe=recipes[0]).update(day=old_day)
+    FavoriteRecipe.objects.create(user=user, recipe=recipes[2])
+    FavoriteRecipe.objects.filter(recipe=recipes[0]).delete()
+    assert RecipePopularity.objects.get(
+        recipe=recipes[0], day=old_day
+    ).favorites == 0
+    assert not RecipePopularity.objects.filter(
+        recipe=recipes[0], day=timezone.localdate()
+    ).exists()
+
+
+@pytest.mark.django_db
+def test_popular_ordering(recipes, fans):
+    for fan in fans:
+        FavoriteRecipe.objects.create(user=fan, recipe=recipes[2])
+    ShoppingCart.objects.create(user=fans[0], recipe=recipes[1])
+    assert get_ordered_ids('popular') == [
+        recipes[2].pk, recipes[1].pk, recipes[0].pk
+    ]
+
+
+@pytest.mark.django_db
+def test_trending_counts_recent_days(recipes, fans, settings):
+    old_day = timezone.localdate() - timedelta(
+        days=settings.POPULARITY_TRENDING_DAYS
+    )
+    for fan in fans:
+        FavoriteRecipe.objects.create(user=fan, recipe=recipes[2])
+    RecipePopularity.objects.filter(recipe=recipes[2]).update(day=old_day)
+    assert get_ordered_ids('popular')[0] == recipes[2].pk
+    # Равные счетчики рецептов 0 и 1 упорядочены по дате публикации.
+    assert get_ordered_ids('trending') == [
+        recipes[1].pk, recipes[0].pk, recipes[2].pk
+    ]
+
+
+@pytest.mark.django_db
+def test_popular_etag_follows_rollups(recipes, fans):
+    client = APIClient()
+    etag = client.get(RECIPES_URL, {'ordering': 'popular'})['ETag']
+    FavoriteRecipe.objects.create(user=fans[0], recipe=recipes[2])
+    response = client.get(
+        RECIPES_URL, {'ordering': 'popular'}, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == 200
+    assert response.json()['results'][0]['id'] == recipes[2].pk
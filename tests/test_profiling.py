@@ -0,0 +1,99 @@
+import pytest
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram.profiling import profiler_lock
+from users.models import User
+
+RECIPES_URL = '/api/recipes/'
+
+
+def get_token_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def staff(db):
+    return User.objects.create_user(
+        email='staff@example.com', username='staff', password='secret',
+        first_name='Сергей', last_name='Сотрудников', is_staff=True
+    )
+
+
+@pytest.fixture
+def staff_client(staff):
+    return get_token_client(staff)
+
+
+def get_profile_id(client, **headers):
+    response = client.get(RECIPES_URL, **headers)
+    assert response.status_code == 200
+    return response.get('X-Profile-Id')
+
+
+@pytest.mark.django_db
+def test_staff_request_profiled(staff_client, recipes):
+    profile_id = get_profile_id(staff_client, HTTP_X_PROFILE='1')
+    assert profile_id
+    response = staff_client.get(f'/api/profiles/{profile_id}/')
+    assert response.status_code == 200
+    report = response.json()
+    assert report['id'] == profile_id
+    assert report['path'] == RECIPES_URL
+    assert report['status'] == 200
+    assert report['sql']['count'] > 0
+    assert report['functions']
+    assert report['tree']['function'].endswith('(get_profiled_response)')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('headers', [{}, {'HTTP_X_PROFILE': '0'}])
+def test_request_without_header_not_profiled(staff_client, recipes,
+                                             headers):
+    assert get_profile_id(staff_client, **headers) is None
+
+
+@pytest.mark.django_db
+def test_non_staff_request_not_profiled(user, recipes):
+    assert get_profile_id(
+        get_token_client(user), HTTP_X_PROFILE='1'
+    ) is None
+    assert get_profile_id(APIClient(), HTTP_X_PROFILE='1') is None
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token invalid')
+    response = client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+    assert response.status_code == 401
+    assert 'X-Profile-Id' not in response
+
+
+@pytest.mark.django_db
+def test_profiles_only_for_staff(staff_client, user, recipes):
+    profile_id = get_profile_id(staff_client, HTTP_X_PROFILE='1')
+    url = f'/api/profiles/{profile_id}/'
+    assert APIClient().get(url).status_code == 401
+    assert get_token_client(user).get(url).status_code == 403
+    assert staff_client.get('/api/profiles/missing/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_profiles_rate_limited(staff_client, author, recipes, settings):
+    settings.PROFILER = {**settings.PROFILER, 'RATE': 2}
+    profile_ids = [
+        get_profile_id(staff_client, HTTP_X_PROFILE='1') for _ in range(3)
+    ]
+    assert all(profile_ids[:2])
+    assert profile_ids[2] is None
+    # Лимит считается отдельно для каждого сотрудника.
+    author.is_staff = True
+    author.save()
+    assert get_profile_id(get_token_client(author), HTTP_X_PROFILE='1')
+
+
+@pytest.mark.django_db
+def test_one_profile_at_a_time(staff_client, recipes):
+    with profiler_lock:
+        assert get_profile_id(staff_client, HTTP_X_PROFILE='1') is None
+    assert get_profile_id(staff_client, HTTP_X_PROFILE='1')
@@ -0,0 +1,75 @@
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from conftest import get_recipe_data
+from foodgram.transactions import on_commit_once
+from recipes.models import RecipeChange
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_recipe_update_logs_one_change(user_client, recipes, tags):
+    '''Все сигналы одного PATCH дают одну запись журнала и один UPDATE.'''
+    recipe = recipes[2]
+    last_change = max(
+        RecipeChange.objects.values_list('pk', flat=True), default=0
+    )
+    with CaptureQueriesContext(connection) as queries:
+        response = user_client.patch(
+            f'{RECIPES_URL}{recipe.pk}/',
+            get_recipe_data(recipe, tags), format='json'
+        )
+    assert response.status_code == 200
+    statements = [query['sql'] for query in queries.captured_queries]
+    assert len([
+        sql for sql in statements if sql.startswith('UPDATE')
+        and '"updated_at"' in sql and '"name"' not in sql
+    ]) == 1
+    assert len([
+        sql for sql in statements
+        if sql.startswith('INSERT INTO "recipes_recipechange"')
+    ]) == 1
+    changes = RecipeChange.objects.filter(pk__gt=last_change)
+    assert list(changes.values_list('recipe_id', flat=True)) == [recipe.pk]
+
+
+@pytest.mark.django_db
+def test_recipe_update_logs_change_inside_transaction(user_client, recipes,
+                                                      tags):
+    '''Запись журнала видна до фиксации: тест идет внутри транзакции.'''
+    recipe = recipes[2]
+    last_change = max(
+        RecipeChange.objects.values_list('pk', flat=True), default=0
+    )
+    response = user_client.patch(
+        f'{RECIPES_URL}{recipe.pk}/',
+        get_recipe_data(recipe, tags), format='json'
+    )
+    assert response.status_code == 200
+    changes = RecipeChange.objects.filter(pk__gt=last_change)
+    assert list(changes.values_list('recipe_id', flat=True)) == [recipe.pk]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_on_commit_once_after_rollbacks():
+    calls = []
+
+    def callback():
+        calls.append(len(calls))
+
+    with transaction.atomic():
+        on_commit_once(callback)
+        on_commit_once(callback)
+    assert calls == [0]
+
+    with pytest.raises(ValueError), transaction.atomic():
+        on_commit_once(callback)
+        raise ValueError
+    with transaction.atomic():
+        with pytest.raises(ValueError), transaction.atomic():
+            on_commit_once(callback)
+            raise ValueError
+        on_commit_once(callback)
+    assert calls == [0, 1]
@@ -0,0 +1,74 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api.readers import COOKING_TIME_FACETS
+
+RECIPES_URL = '/api/recipes/'
+
+
+def get_facets(client, params):
+    response = client.get(RECIPES_URL, {'facets': 1, 'limit': 1, **params})
+    assert response.status_code == 200
+    return response.json()['facets']
+
+
+def count_facets(recipes, tags):
+    '''Ожидаемые счетчики, посчитанные по объектам рецептов.'''
+    return {
+        'tags': [{
+            'id': tag.pk,
+            'name': tag.name,
+            'slug': tag.slug,
+            'count': sum(tag in recipe.tags.all() for recipe in recipes),
+        } for tag in tags],
+        'cooking_time': [{
+            'min': minimum,
+            'max': maximum,
+            'count': sum(
+                minimum <= recipe.cooking_time
+                and (maximum is None or recipe.cooking_time <= maximum)
+                for recipe in recipes
+            ),
+        } for minimum, maximum in COOKING_TIME_FACETS],
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params, expected', [
+    ({}, [0, 1, 2]),
+    ({'tags': 'dinner'}, [2]),
+    ({'tags': ['breakfast', 'dinner']}, [0, 1, 2]),
+    ({'tags_all': ['breakfast', 'lunch']}, [1]),
+    ({'cooking_time_min': 6}, [0, 2]),
+    ({'cooking_time_max': 10, 'tags': 'lunch'}, [1]),
+    ({'ordering': 'popular', 'cooking_time_min': 100}, []),
+])
+def test_facets_count_filtered_recipes(recipes, tags, params, expected):
+    facets = get_facets(APIClient(), params)
+    assert facets == count_facets([recipes[i] for i in expected], tags)
+
+
+@pytest.mark.django_db
+def test_facets_follow_author_filter(recipes, tags, author):
+    facets = get_facets(APIClient(), {'author': author.pk})
+    assert facets == count_facets(
+        [recipe for recipe in recipes if recipe.author == author], tags
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params, expected', [
+    ({'is_favorited': 1}, [0]),
+    ({'is_in_shopping_cart': 1}, [1]),
+])
+def test_facets_follow_user_filters(user_client, recipes, tags, params,
+                                    expected):
+    facets = get_facets(user_client, params)
+    assert facets == count_facets([recipes[i] for i in expected], tags)
+
+
+@pytest.mark.django_db
+def test_facets_only_on_request(recipes):
+    response = APIClient().get(RECIPES_URL)
+    assert response.status_code == 200
+    assert 'facets' not in response.json()
@@ -0,0 +1,53 @@
+import pytest
+from rest_framework.test import APIClient
+
+from recipes.models import Tag
+
+RECIPES_URL = '/api/recipes/'
+
+
+def get_list_and_details(client, params=''):
+    '''Страница списка и ответы retrieve для тех же рецептов.'''
+    ids = [
+        recipe['id'] for recipe
+        in client.get(f'{RECIPES_URL}?limit=10&fields=id').json()['results']
+    ]
+    response = client.get(f'{RECIPES_URL}?limit=10{params}')
+    assert response.status_code == 200
+    details = []
+    for pk in ids:
+        detail = client.get(f'{RECIPES_URL}{pk}/?{params}')
+        assert detail.status_code == 200
+        details.append(detail.json())
+    return response.json()['results'], details
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', ['', '&fields=id,tags,author', '&omit=text'])
+def test_list_matches_serializer_for_anonymous(recipes, params):
+    results, details = get_list_and_details(APIClient(), params)
+    assert len(results) == len(recipes)
+    assert results == details
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', ['', '&fields=is_favorited,author'])
+def test_list_matches_serializer_for_user(user_client, recipes, params):
+    results, details = get_list_and_details(user_client, params)
+    assert len(results) == len(recipes)
+    assert results == details
+    assert any(recipe.get('is_favorited') for recipe in results)
+
+
+@pytest.mark.django_db
+def test_list_matches_serializer_after_tag_created(recipes, tags):
+    '''Тег, которого еще нет в каталоге, читается из базы.'''
+    client = APIClient()
+    assert client.get(RECIPES_URL).status_code == 200
+    tag = Tag.objects.create(name='Десерт', color='#F0A0A0', slug='dessert')
+    recipes[0].tags.add(tag)
+    results, details = get_list_and_details(client)
+    assert results == details
+    assert 'dessert' in [
+        item['slug'] for recipe in results for item in recipe['tags']
+    ]
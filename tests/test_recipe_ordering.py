@@ -0,0 +1,67 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+
+from api.filters import RecipesFilter
+from recipes.models import Recipe
+
+# Сортировка -> индекс без фильтра по автору и с ним.
+ORDERING_INDEXES = {
+    'newest': ('recipe_pub_date_idx', 'recipe_author_pub_date_idx'),
+    'fastest': ('recipe_cooking_time_idx', 'recipe_author_cooking_idx'),
+    'alphabetical': ('recipe_name_idx', 'recipe_author_name_idx'),
+}
+
+
+def get_plan(data):
+    request = APIRequestFactory().get('/api/recipes/', data)
+    request.user = AnonymousUser()
+    queryset = RecipesFilter(
+        data=data, queryset=Recipe.objects.all(), request=request
+    ).qs[:6]
+    if connection.vendor == 'postgresql':
+        # На нескольких строках планировщик выбрал бы Seq Scan и Sort.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+    return queryset.explain()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ordering', ORDERING_INDEXES)
+def test_ordering_uses_index(recipes, ordering):
+    plan = get_plan({'ordering': ordering, 'tags': ['breakfast', 'lunch']})
+    assert ORDERING_INDEXES[ordering][0] in plan
+    # Теги проверяются по tags_mask, без таблицы связей.
+    assert 'recipes_recipe_tags' not in plan
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ordering', ORDERING_INDEXES)
+def test_ordering_with_author_uses_index(recipes, author, ordering):
+    plan = get_plan({
+        'ordering': ordering, 'author': author.pk, 'tags': ['breakfast'],
+    })
+    assert ORDERING_INDEXES[ordering][1] in plan
+
+
+# Ожидаемый порядок: ключ сортировки и обратный ли он.
+ORDERING_KEYS = {
+    'newest': (lambda recipe: (recipe.pub_date, recipe.pk), True),
+    'fastest': (lambda recipe: (recipe.cooking_time, recipe.pk), False),
+    'alphabetical': (lambda recipe: (recipe.name, recipe.pk), False),
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ordering', ORDERING_INDEXES)
+def test_ordering_results(recipes, ordering):
+    request = APIRequestFactory().get('/api/recipes/')
+    request.user = AnonymousUser()
+    found = RecipesFilter(
+        data={'ordering': ordering}, queryset=Recipe.objects.all(),
+        request=request
+    ).qs
+    key, reverse = ORDERING_KEYS[ordering]
+    assert list(found) == sorted(recipes, key=key, reverse=reverse)
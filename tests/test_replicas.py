@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+from django.conf import settings
+
+from foodgram.db_router import is_pinned_to_primary
+
+# Запись, обработанная другим воркером.
+PIN_SCRIPT = '''
+import django
+django.setup()
+from types import SimpleNamespace
+from foodgram.db_router import pin_to_primary
+pin_to_primary(SimpleNamespace(pk=42))
+'''
+
+
+@pytest.mark.django_db
+def test_batch_request_does_not_pin_to_primary(user_client, user, recipes):
+    response = user_client.post('/api/batch/', {'requests': [
+        {'resource': 'recipes'}, {'resource': 'tags'},
+    ]}, format='json')
+    assert response.status_code == 200
+    assert not is_pinned_to_primary(user)
+
+
+@pytest.mark.django_db
+def test_write_pins_to_primary(user_client, user, recipes):
+    response = user_client.post(f'/api/recipes/{recipes[2].pk}/favorite/')
+    assert response.status_code < 400
+    assert is_pinned_to_primary(user)
+
+
+def test_pin_is_visible_to_other_processes():
+    subprocess.run(
+        [sys.executable, '-c', PIN_SCRIPT],
+        check=True,
+        cwd=settings.BASE_DIR,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'foodgram.settings'},
+    )
+    assert is_pinned_to_primary(SimpleNamespace(pk=42, is_authenticated=True))
@@ -0,0 +1,51 @@
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from recipes.models import IngredientAmount, RecipeChange, SimilarRecipesToken
+
+
+@pytest.mark.django_db
+def test_first_incremental_run_builds_index(recipes):
+    '''На новой установке первый запуск сервиса строит индекс целиком.'''
+    pancakes, omelette, noodles = recipes
+    call_command('similar_recipes', '--incremental')
+    response = APIClient().get(f'/api/recipes/{pancakes.pk}/similar/')
+    assert response.status_code == 200
+    assert {recipe['id'] for recipe in response.json()} == {
+        omelette.pk, noodles.pk
+    }
+
+
+@pytest.mark.django_db
+def test_incremental_run_continues_from_stored_token(recipes, ingredients,
+                                                     settings, monkeypatch):
+    '''
+    Токен хранится в базе: очистка кэшей не приводит к полному
+    пересчету, а изменения после прошлого запуска учитываются.
+    '''
+    settings.RECIPE_CHANGES_SETTLE_SECONDS = 0
+    pancakes, omelette, noodles = recipes
+    call_command('similar_recipes', '--incremental')
+    latest = RecipeChange.objects.latest('id').id
+    assert SimilarRecipesToken.objects.get().change_id == latest
+    for cache in caches.all():
+        cache.clear()
+
+    def fail():
+        raise AssertionError('full rebuild')
+
+    monkeypatch.setattr(
+        'recipes.management.commands.similar_recipes.rebuild_similar', fail
+    )
+    noodles.recipe.all().delete()
+    IngredientAmount.objects.create(
+        recipe=noodles, ingredient=ingredients[2], amount=2
+    )
+    call_command('similar_recipes', '--incremental')
+    assert SimilarRecipesToken.objects.get().change_id == (
+        RecipeChange.objects.latest('id').id
+    )
+    response = APIClient().get(f'/api/recipes/{noodles.pk}/similar/')
+    assert [recipe['id'] for recipe in response.json()] == [omelette.pk]
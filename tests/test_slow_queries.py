@@ -0,0 +1,37 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.models import SlowQuery
+from foodgram.middleware import SlowQueryMiddleware
+from recipes.models import Recipe
+
+
+@pytest.fixture
+def record_all_queries(settings):
+    settings.SLOW_QUERIES = {
+        **settings.SLOW_QUERIES, 'THRESHOLD_MS': 0, 'EXPLAIN_SAMPLE_RATE': 0,
+    }
+
+
+def get_response(request):
+    list(Recipe.objects.all())
+    return HttpResponse()
+
+
+@pytest.mark.django_db
+def test_slow_queries_are_saved_after_response(record_all_queries):
+    request = RequestFactory().get('/api/recipes/')
+    request.endpoint = 'recipes.list'
+    response = SlowQueryMiddleware(get_response)(request)
+    assert not SlowQuery.objects.exists()
+    response.close()
+    assert list(SlowQuery.objects.values_list('endpoint', flat=True)) == [
+        'recipes.list'
+    ]
+
+
+@pytest.mark.django_db
+def test_slow_queries_of_api_request(record_all_queries, recipes, client):
+    assert client.get('/api/recipes/').status_code == 200
+    assert SlowQuery.objects.filter(endpoint='recipes.list').exists()
@@ -0,0 +1,36 @@
+import pytest
+
+from conftest import get_recipe_data
+from recipes.models import Recipe
+
+RECIPES_URL = '/api/recipes/'
+
+
+@pytest.mark.django_db
+def test_recipe_update_keeps_tags_mask(user_client, user, recipes, tags):
+    recipe = recipes[2]
+    breakfast, lunch, dinner = tags
+    response = user_client.patch(
+        f'{RECIPES_URL}{recipe.pk}/',
+        get_recipe_data(recipe, [breakfast, lunch]), format='json'
+    )
+    assert response.status_code == 200
+    recipe = Recipe.objects.get(pk=recipe.pk)
+    assert recipe.tags_mask == 1 << breakfast.bit | 1 << lunch.bit
+    found = user_client.get(f'{RECIPES_URL}?tags=breakfast&fields=id').json()
+    assert recipe.pk in [item['id'] for item in found['results']]
+    found = user_client.get(f'{RECIPES_URL}?tags=dinner&fields=id').json()
+    assert recipe.pk not in [item['id'] for item in found['results']]
+    listed = user_client.get(f'{RECIPES_URL}?fields=id,tags').json()
+    detail = user_client.get(f'{RECIPES_URL}{recipe.pk}/?fields=id,tags')
+    assert detail.json() in listed['results']
+
+
+@pytest.mark.django_db
+def test_recipe_tags_set_updates_instance_mask(recipes, tags):
+    recipe = recipes[0]
+    recipe.tags.set(tags[1:])
+    recipe.save()
+    assert Recipe.objects.get(pk=recipe.pk).tags_mask == (
+        1 << tags[1].bit | 1 << tags[2].bit
+    )
@@ -0,0 +1,38 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api.throttling import AnonTokenBucketThrottle
+
+
+@pytest.fixture
+def anon_rate(monkeypatch):
+    monkeypatch.setitem(
+        AnonTokenBucketThrottle.THROTTLE_RATES, 'anon', '2/min'
+    )
+
+
+def get_tags(client, forwarded_for):
+    '''Запрос через nginx: REMOTE_ADDR — адрес контейнера прокси.'''
+    return client.get(
+        '/api/tags/', HTTP_X_FORWARDED_FOR=forwarded_for,
+        REMOTE_ADDR='172.18.0.5'
+    ).status_code
+
+
+@pytest.mark.django_db
+def test_anonymous_clients_behind_proxy_have_own_buckets(anon_rate, tags):
+    client = APIClient()
+    statuses = [get_tags(client, '203.0.113.1') for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert get_tags(client, '203.0.113.2') == 200
+
+
+@pytest.mark.django_db
+def test_forged_forwarded_for_is_ignored(anon_rate, tags):
+    '''Клиент не может сменить ведро, подставив свой X-Forwarded-For.'''
+    client = APIClient()
+    statuses = [
+        get_tags(client, f'10.0.0.{number}, 203.0.113.1')
+        for number in range(3)
+    ]
+    assert statuses == [200, 200, 429]
@@ -0,0 +1,96 @@
+import pytest
+from rest_framework.test import APIClient
+
+STATE_URL = '/api/users/me/state/'
+
+
+def get_state(client):
+    response = client.get(STATE_URL)
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.django_db
+def test_state_lists(user_client, recipes, author):
+    state = get_state(user_client)
+    assert state['favorited'] == [recipes[0].pk]
+    assert state['shopping_cart'] == [recipes[1].pk]
+    assert state['subscriptions'] == [author.pk]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('method, path', [
+    ('post', 'recipes/{recipe}/favorite/'),
+    ('delete', 'recipes/{favorite}/favorite/'),
+    ('post', 'recipes/{recipe}/shopping_cart/'),
+    ('delete', 'recipes/{cart}/shopping_cart/'),
+    ('delete', 'users/{author}/subscribe/'),
+])
+def test_state_version_bumped(user_client, recipes, author, method, path):
+    version = get_state(user_client)['version']
+    url = '/api/' + path.format(
+        recipe=recipes[2].pk, favorite=recipes[0].pk, cart=recipes[1].pk,
+        author=author.pk
+    )
+    assert getattr(user_client, method)(url).status_code in (201, 204)
+    assert get_state(user_client)['version'] > version
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path', ['favorite', 'shopping_cart'])
+def test_state_version_bumped_by_batch(user_client, recipes, path):
+    version = get_state(user_client)['version']
+    response = user_client.post(
+        f'/api/recipes/{path}/', {'recipes': [recipes[2].pk]}, format='json'
+    )
+    assert response.status_code == 201
+    state = get_state(user_client)
+    assert state['version'] > version
+    assert recipes[2].pk in state[
+        'favorited' if path == 'favorite' else 'shopping_cart'
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('method, path', [
+    ('post', 'recipes/{favorite}/favorite/'),
+    ('delete', 'recipes/{recipe}/favorite/'),
+    ('delete', 'recipes/{recipe}/shopping_cart/'),
+])
+def test_state_version_kept_on_rejected_change(user_client, recipes, method,
+                                               path):
+    version = get_state(user_client)['version']
+    url = '/api/' + path.format(
+        recipe=recipes[2].pk, favorite=recipes[0].pk
+    )
+    assert getattr(user_client, method)(url).status_code == 400
+    assert get_state(user_client)['version'] == version
+
+
+@pytest.mark.django_db
+def test_state_not_modified(user_client, recipes):
+    response = user_client.get(STATE_URL)
+    etag = response['ETag']
+    assert etag == f'"state-{response.json()["version"]}"'
+    assert user_client.get(
+        STATE_URL, HTTP_IF_NONE_MATCH=etag
+    ).status_code == 304
+    user_client.post(f'/api/recipes/{recipes[2].pk}/favorite/')
+    changed = user_client.get(STATE_URL, HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == 200
+    assert recipes[2].pk in changed.json()['favorited']
+
+
+@pytest.mark.django_db
+def test_state_of_other_user_unchanged(user_client, recipes, author):
+    client = APIClient()
+    client.force_authenticate(author)
+    version = get_state(client)['version']
+    user_client.post(f'/api/recipes/{recipes[2].pk}/favorite/')
+    user_client.delete(f'/api/users/{author.pk}/subscribe/')
+    assert get_state(client)['version'] == version
+
+
+@pytest.mark.django_db
+def test_state_requires_authentication(recipes):
+    assert APIClient().get(STATE_URL).status_code == 401